@@ -26,6 +26,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.replica_middleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -48,6 +49,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.notifications_ctx',
+                'core.context_processors.cart_ctx',
             ],
         },
     },
@@ -55,13 +57,120 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'config.wsgi.application'
 
+# SQLite profile (SQLITE_PROFILE environment variable):
+#   'default'    : stock settings (development, tests);
+#   'production' : WAL journal (readers are not blocked by the writer),
+#                  synchronous=NORMAL, larger cache and mmap, a 20 s wait
+#                  on a lock instead of an error, connections kept across
+#                  requests and transactions opened with BEGIN IMMEDIATE so
+#                  writers queue up instead of deadlocking. Measured by
+#                  `bench_sqlite`.
+# The PRAGMAs are applied to every connection by core.signals.configure_sqlite.
+SQLITE_PROFILES = {
+    'default': {'DATABASE': {}, 'PRAGMAS': {}},
+    'production': {
+        'DATABASE': {
+            'CONN_MAX_AGE': 600,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+        },
+        'PRAGMAS': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 20000,       # ms
+            'cache_size': -64000,        # KiB, i.e. 64 MB
+            'mmap_size': 268435456,      # 256 MB
+            'temp_store': 'MEMORY',
+        },
+    },
+}
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'default')
+SQLITE_PRAGMAS = SQLITE_PROFILES[SQLITE_PROFILE]['PRAGMAS']
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        **SQLITE_PROFILES[SQLITE_PROFILE]['DATABASE'],
     }
 }
 
+# Read replica (REPLICA_PATH environment variable, an SQLite file kept up to
+# date by `python manage.py sync_replica --loop`). Reads of GET requests
+# (catalogue, dashboard, reports) go there; writes, POST requests (checkout,
+# order statuses) and sessions stay on the primary, as does a browser that
+# has just written, for REPLICA_STICKY_SECONDS seconds. See core.routers.
+REPLICA_PATH = os.environ.get('REPLICA_PATH')
+REPLICA_DATABASE = 'replica' if REPLICA_PATH else None
+REPLICA_STICKY_SECONDS = 10
+if REPLICA_PATH:
+    DATABASES['replica'] = {**DATABASES['default'], 'NAME': REPLICA_PATH, 'TEST': {'MIRROR': 'default'}}
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# Cache (unread notification counters, public pages, catalogue fragments,
+# etc.). The local memory cache is enough in development; in production with
+# several workers, use a shared cache (Redis, Memcached) so counters and
+# invalidations stay consistent.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Sessions get their own caches: the 300-entry 'default' cache would evict
+    # them in favour of pages and fragments. The file cache counts its files
+    # once a minute instead of listing the directory on every write (see
+    # core.cache_backends).
+    'sessions': {
+        'BACKEND': 'core.cache_backends.SessionFileCache',
+        'LOCATION': BASE_DIR / 'var' / 'sessions',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 100000, 'CULL_INTERVAL': 60},
+    },
+    'memory_sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sessions',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# Session, hence cart, storage (SESSION_STORAGE environment variable):
+#   'db'     : django_session table (default);
+#   'cache'  : the local file cache above, no SQLite writes;
+#   'memory' : the process's memory cache, for a single worker;
+#   'cookie' : signed cookie, for small carts only (~4 KB).
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'memory': 'django.contrib.sessions.backends.cache',
+    'cookie': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_STORAGE = os.environ.get('SESSION_STORAGE', 'db')
+SESSION_ENGINE = SESSION_ENGINES[SESSION_STORAGE]
+SESSION_CACHE_ALIAS = 'memory_sessions' if SESSION_STORAGE == 'memory' else 'sessions'
+
+# Notifications: 'sync' writes them straight away (development, tests),
+# 'outbox' leaves them in NotificationOutbox for the
+# `python manage.py drain_notifications --loop` worker.
+NOTIFICATION_DELIVERY = os.environ.get('NOTIFICATION_DELIVERY', 'sync')
+NOTIFICATION_BATCH_SIZE = 500
+# Older read notifications are deleted by `purge_notifications`.
+NOTIFICATION_RETENTION_DAYS = 90
+
+# Thumbnails and WebP variants of uploaded images: 'sync' makes them during
+# the upload request (development, tests), 'queue' leaves the image pending
+# for the `python manage.py process_images --loop` worker.
+IMAGE_PROCESSING = os.environ.get('IMAGE_PROCESSING', 'sync')
+
+# Catalogue import: rows written per transaction.
+PRODUCT_IMPORT_BATCH_SIZE = 500
+
+# Stock holds: an item added to a cart is held for STOCK_HOLD_MINUTES
+# (extended on every cart visit, up to STOCK_HOLD_MAX_MINUTES after it was
+# first added), then released. Expired holds are deleted by
+# `release_holds --loop`.
+STOCK_HOLD_MINUTES = 15
+STOCK_HOLD_MAX_MINUTES = 60
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
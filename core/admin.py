@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Shop, Category, Product, Order, OrderItem, Notification
+from .models import Shop, Category, Product, Order, OrderItem, Notification, ShopDailyStats
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
@@ -7,8 +7,28 @@ class NotificationAdmin(admin.ModelAdmin):
     list_filter  = ['notif_type', 'is_read']
     search_fields = ['recipient__username', 'message']
 
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ['id', 'customer', 'shop', 'status', 'total', 'created_at']
+    list_filter  = ['status', 'shop']
+    date_hierarchy = 'created_at'
+    list_select_related = ['customer', 'shop']
+    readonly_fields = ['seller']
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        context = getattr(response, 'context_data', None)
+        if context and 'cl' in context:
+            context['summary'] = context['cl'].queryset.summary()
+        return response
+
 admin.site.register(Shop)
 admin.site.register(Category)
 admin.site.register(Product)
-admin.site.register(Order)
 admin.site.register(OrderItem)
+
+@admin.register(ShopDailyStats)
+class ShopDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ['shop', 'day', 'orders', 'pending', 'delivered', 'cancelled', 'revenue', 'units_sold']
+    list_filter  = ['shop']
+    date_hierarchy = 'day'
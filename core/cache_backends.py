@@ -0,0 +1,26 @@
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+class SessionFileCache(FileBasedCache):
+    """File cache that looks for entries to cull once in a while.
+
+    ``FileBasedCache`` lists its whole directory on every ``set()`` to
+    decide whether it is full; with one file per session, every request
+    that saves a session would list every visitor's file. Here the check
+    runs at most every ``OPTIONS['CULL_INTERVAL']`` seconds (60 by default)
+    per cache instance, so the directory may briefly exceed ``MAX_ENTRIES``.
+    """
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._cull_interval = params.get('OPTIONS', {}).get('CULL_INTERVAL', 60)
+        self._next_cull = 0
+
+    def _cull(self):
+        now = time.monotonic()
+        if now < self._next_cull:
+            return
+        self._next_cull = now + self._cull_interval
+        super()._cull()
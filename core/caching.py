@@ -0,0 +1,145 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.middleware.csrf import get_token
+from django.core.cache import cache
+from django.db import transaction
+
+from .context_processors import aload
+from .models import Product
+from .routers import reading_replica
+
+PAGE_TIMEOUT = 600
+
+# Scopes whose version keys make up the cache keys below. Pages and
+# fragments are never deleted: bumping a version makes every key built
+# from it unreachable, and the stale entries simply expire.
+HOME = 'home'
+SHOP_LIST = 'shops'
+# Bumped by sync_replica after each copy: whatever was built from the
+# replica depends on it too, so it never outlives the copy it came from.
+REPLICA = 'replica'
+
+
+def shop_scope(shop_id):
+    return f'shop:{shop_id}'
+
+
+def product_scope(product_id):
+    return f'product:{product_id}'
+
+
+def _version_key(scope):
+    return f'catalogue_version:{scope}'
+
+
+def _with_replica(scopes):
+    scopes = list(scopes)
+    return [*scopes, REPLICA] if reading_replica() else scopes
+
+
+def versions(scopes):
+    """Return ``{scope: version}``, starting a version for unknown scopes.
+
+    While reads come from the replica, ``REPLICA`` is part of the result.
+    """
+    keys = {_version_key(scope): scope for scope in _with_replica(scopes)}
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {scope: found[key] for key, scope in keys.items()}
+
+
+async def aversions(scopes):
+    keys = {_version_key(scope): scope for scope in _with_replica(scopes)}
+    found = await cache.aget_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        await cache.aset_many(missing, None)
+        found.update(missing)
+    return {scope: found[key] for key, scope in keys.items()}
+
+
+def bump(scopes):
+    """Invalidate every page and fragment cached under ``scopes``.
+
+    Versions are timestamps rather than counters so that a version lost to
+    cache eviction can never come back with a value already used in a key.
+    """
+    if scopes:
+        now = time.time_ns()
+        cache.set_many({_version_key(scope): now for scope in scopes}, None)
+
+
+def catalogue_changed(shop_ids=(), product_ids=(), home=True):
+    """Bump the scopes of the given shops and products once the transaction commits."""
+    scopes = {shop_scope(pk) for pk in shop_ids} | {product_scope(pk) for pk in product_ids}
+    if home:
+        scopes |= {HOME, SHOP_LIST}
+    transaction.on_commit(lambda: bump(scopes))
+
+
+def shop_products_changed(shop_id):
+    """Bump a shop and every product it sells, e.g. after a rename."""
+    catalogue_changed([shop_id], Product.objects.filter(shop_id=shop_id).values_list('pk', flat=True))
+
+
+def orders_changed():
+    """Order figures only appear on the home page."""
+    transaction.on_commit(lambda: bump([HOME]))
+
+
+def with_versions(objects, scope):
+    """Set ``cache_version`` on each object, for ``{% cache %}`` fragment keys."""
+    objects = list(objects)
+    _set_versions(objects, scope, versions(scope(obj.pk) for obj in objects))
+    return objects
+
+
+def _set_versions(objects, scope, found):
+    suffix = f'.{found[REPLICA]}' if REPLICA in found else ''
+    for obj in objects:
+        obj.cache_version = f'{found[scope(obj.pk)]}{suffix}'
+
+
+async def awith_versions(objects, scope):
+    objects = list(objects)
+    _set_versions(objects, scope, await aversions(scope(obj.pk) for obj in objects))
+    return objects
+
+
+def _page_key(request, found):
+    raw = request.get_full_path() + '|' + ','.join(f'{scope}={found[scope]}' for scope in sorted(found))
+    return 'page:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def cache_public_page(scopes):
+    """Serve anonymous GET requests to an async view from the cache.
+
+    ``scopes(**kwargs)`` receives the view's URL arguments and returns the
+    scopes the page depends on. Logged-in users, requests carrying flash
+    messages and responses that set cookies always go through the view.
+
+    Cached pages carry no CSRF token; their forms (``data-csrf``) read it
+    from the cookie, which every response sets if missing.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            await aload(request)
+            get_token(request)
+            if request.method != 'GET' or request.user.is_authenticated or get_messages(request):
+                return await view(request, *args, **kwargs)
+            key = _page_key(request, await aversions(scopes(**kwargs)))
+            response = await cache.aget(key)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.cookies:
+                    await cache.aset(key, response, PAGE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,90 @@
+import uuid
+from decimal import Decimal
+
+from .models import Product
+
+
+class Cart:
+    """Shopping cart stored in the session as ``{product_id: quantity}``.
+
+    Unit prices are kept next to the quantities so ``summary()`` can show
+    the item count and total without touching ``Product``; they are
+    refreshed every time the cart is hydrated with ``lines()``.
+    """
+    SESSION_KEY = 'cart'
+    PRICES_KEY = 'cart_prices'
+    HOLDER_KEY = 'cart_holder'
+
+    def __init__(self, session):
+        self.session = session
+        self.quantities = session.get(self.SESSION_KEY, {})
+        self.prices = session.get(self.PRICES_KEY, {})
+
+    def __len__(self):
+        return len(self.quantities)
+
+    def __bool__(self):
+        return bool(self.quantities)
+
+    @property
+    def holder(self):
+        """Key of this cart's stock holds; it survives login, unlike the session key."""
+        holder = self.session.get(self.HOLDER_KEY)
+        if holder is None:
+            holder = self.session[self.HOLDER_KEY] = uuid.uuid4().hex
+        return holder
+
+    def quantity(self, product_id):
+        return self.quantities.get(str(product_id), 0)
+
+    def add(self, product, quantity=1):
+        key = str(product.pk)
+        self.quantities[key] = self.quantities.get(key, 0) + quantity
+        self.prices[key] = str(product.price)
+        self._save()
+
+    def remove(self, product_id):
+        key = str(product_id)
+        if key not in self.quantities:
+            return False
+        del self.quantities[key]
+        self.prices.pop(key, None)
+        self._save()
+        return True
+
+    def clear(self):
+        self.quantities, self.prices = {}, {}
+        self._save()
+
+    def lines(self):
+        """Load every product in one query and return ``(items, total)``.
+
+        Products that no longer exist are dropped from the session in a
+        single write.
+        """
+        products = Product.objects.select_related('shop').in_bulk([int(pk) for pk in self.quantities])
+        items, total, prices = [], Decimal('0'), {}
+        for key, quantity in self.quantities.items():
+            product = products.get(int(key))
+            if product is None:
+                continue
+            subtotal = product.price * quantity
+            total += subtotal
+            prices[key] = str(product.price)
+            items.append({'product': product, 'quantity': quantity, 'subtotal': subtotal})
+        if prices != self.prices or len(prices) != len(self.quantities):
+            self.quantities = {key: qty for key, qty in self.quantities.items() if key in prices}
+            self.prices = prices
+            self._save()
+        return items, total
+
+    def summary(self):
+        total = sum(
+            (Decimal(self.prices.get(key, '0')) * quantity for key, quantity in self.quantities.items()),
+            Decimal('0'),
+        )
+        return {'lines': len(self.quantities), 'count': sum(self.quantities.values()), 'total': total}
+
+    def _save(self):
+        self.session[self.SESSION_KEY] = self.quantities
+        self.session[self.PRICES_KEY] = self.prices
@@ -0,0 +1,112 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+
+from .caching import catalogue_changed
+from .models import Product, Order, OrderItem, Notification
+from .stats import record_new_orders
+from .notifications import queue
+from .reservations import held, release
+
+
+class CheckoutError(Exception):
+    pass
+
+
+def _load_cart(cart):
+    lines = {int(product_id): quantity for product_id, quantity in cart.items()}
+    products = Product.objects.select_related('shop__owner').in_bulk(list(lines))
+    if len(products) != len(lines):
+        raise CheckoutError('Un produit de votre panier est introuvable.')
+    return [(products[pid], quantity) for pid, quantity in lines.items()]
+
+
+def _reserve_stock(items, others=None):
+    """Decrement stock for every line in one conditional UPDATE.
+
+    Each row only matches if it still holds enough stock on top of what
+    other carts hold (``others``, ``{product_id: quantity}``), so a short
+    row count means another buyer got there first and the transaction is
+    rolled back by the caller.
+    """
+    others = others or {}
+    enough_stock = Q()
+    new_stock = []
+    for product, quantity in items:
+        enough_stock |= Q(pk=product.pk, stock__gte=quantity + others.get(product.pk, 0))
+        new_stock.append(When(pk=product.pk, then=F('stock') - quantity))
+    updated = Product.objects.filter(enough_stock).update(stock=Case(*new_stock))
+    if updated != len(items):
+        current = Product.objects.in_bulk([product.pk for product, _ in items])
+        for product, quantity in items:
+            left = current[product.pk].stock - others.get(product.pk, 0)
+            if left < quantity:
+                raise CheckoutError(f'Stock insuffisant pour « {product.name} » (disponible : {max(left, 0)}).')
+        raise CheckoutError('Le stock a changé pendant la commande, veuillez réessayer.')
+
+
+def place_orders(user, cart, holder=None):
+    """Turn a session cart into one order per shop and return the orders.
+
+    The stock held for the cart ``holder`` becomes the sale; stock held by
+    other carts cannot be bought. The query count is constant: one read of
+    the cart, one delete of its holds, one read of the other carts' holds,
+    one stock update, one bulk insert each for orders, order items and
+    queued seller notifications, and two queries to bump the daily rollup.
+    Raises ``CheckoutError`` with a user-facing message on failure.
+    """
+    items = _load_cart(cart)
+    for product, quantity in items:
+        if product.shop.owner_id == user.pk:
+            raise CheckoutError(
+                f'« {product.name} » appartient à votre boutique « {product.shop.name} ». '
+                'Impossible de commander vos propres produits.'
+            )
+        if product.stock < quantity:
+            raise CheckoutError(f'Stock insuffisant pour « {product.name} » (disponible : {product.stock}).')
+
+    shops_map: dict = {}
+    for product, quantity in items:
+        shops_map.setdefault(product.shop_id, {'shop': product.shop, 'items': []})['items'].append((product, quantity))
+
+    with transaction.atomic():
+        # Deleting first takes SQLite's write lock before the holds are summed.
+        if holder:
+            release(holder, [product.pk for product, _ in items])
+        _reserve_stock(items, held([product.pk for product, _ in items]))
+        catalogue_changed(shops_map, [product.pk for product, _ in items])
+
+        orders = Order.objects.bulk_create([
+            Order(
+                customer=user, shop=data['shop'], seller_id=data['shop'].owner_id, status='pending',
+                total=sum((product.price * quantity for product, quantity in data['items']), Decimal('0')),
+            )
+            for data in shops_map.values()
+        ])
+
+        order_items = []
+        for order, data in zip(orders, shops_map.values()):
+            data['order'] = order
+            order_items += [
+                OrderItem(order=order, product=product, quantity=quantity, price=product.price)
+                for product, quantity in data['items']
+            ]
+        OrderItem.objects.bulk_create(order_items)
+        record_new_orders(orders, order_items)
+
+        buyer_name = f"{user.first_name} {user.last_name}".strip() or user.username
+        queue([
+            Notification(
+                recipient=data['shop'].owner,
+                notif_type='new_order',
+                order=data['order'],
+                message=(
+                    f"🛒 Nouvelle commande #{data['order'].id} sur « {data['shop'].name} » "
+                    f"de {buyer_name} — {data['order'].total:.2f} € "
+                    f"({', '.join(product.name for product, _ in data['items'])})."
+                ),
+            )
+            for data in shops_map.values()
+        ])
+    return orders
@@ -1,6 +1,32 @@
+from django.utils.functional import SimpleLazyObject
+
+from .cart import Cart
+from .notifications import aunread_count, unread_count
+
+
+async def aload(request):
+    """Resolve the user and the session before an async view renders.
+
+    The processors below read both lazily; doing it from the event loop
+    would run their queries synchronously and fail.
+    """
+    request.user = await request.auser()
+    await request.session.aget(Cart.SESSION_KEY)
+
+
 def notifications_ctx(request):
     if request.user.is_authenticated:
-        unread_notifs = request.user.notifications.filter(is_read=False).count()
+        unread_notifs = SimpleLazyObject(lambda: unread_count(request.user))
     else:
         unread_notifs = 0
     return {'unread_notifs': unread_notifs}
+
+
+async def anotifications_ctx(request):
+    if request.user.is_authenticated:
+        return {'unread_notifs': await aunread_count(request.user)}
+    return {'unread_notifs': 0}
+
+
+def cart_ctx(request):
+    return {'cart_summary': SimpleLazyObject(lambda: Cart(request.session).summary())}
@@ -0,0 +1,46 @@
+from django.contrib.auth.models import User
+from django.db.models import Case, F, Value, When
+
+from .models import Order, Product, Shop, SiteCounter
+
+# How each counter is computed from scratch by ``reconcile``.
+SOURCES = {
+    'products': lambda: Product.objects.count(),
+    'shops': lambda: Shop.objects.count(),
+    'users': lambda: User.objects.count(),
+    'delivered_orders': lambda: Order.objects.filter(status='delivered').count(),
+}
+
+
+def totals():
+    """Return every counter in one query, missing ones as 0."""
+    values = dict(SiteCounter.objects.values_list('name', 'value'))
+    return {name: values.get(name, 0) for name in SOURCES}
+
+
+async def atotals():
+    values = {name: value async for name, value in SiteCounter.objects.values_list('name', 'value')}
+    return {name: values.get(name, 0) for name in SOURCES}
+
+
+def add(deltas):
+    """Shift counters by ``deltas`` (``{name: delta}``) with a single UPDATE."""
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    SiteCounter.objects.filter(name__in=deltas).update(value=F('value') + Case(
+        *[When(name=name, then=Value(delta)) for name, delta in deltas.items()],
+        default=Value(0),
+    ))
+
+
+def reconcile():
+    """Recount every counter, fix the stored values and return ``{name: drift}``."""
+    drift = {}
+    stored = dict(SiteCounter.objects.values_list('name', 'value'))
+    for name, source in SOURCES.items():
+        actual = source()
+        if stored.get(name) != actual:
+            SiteCounter.objects.update_or_create(name=name, defaults={'value': actual})
+        drift[name] = actual - stored.get(name, 0)
+    return drift
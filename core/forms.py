@@ -3,6 +3,9 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import Shop, Product, Category
 
+# Largest primary key: ids beyond it cannot even be bound to an SQLite query.
+MAX_ID = 2 ** 63 - 1
+
 
 class CustomUserCreationForm(UserCreationForm):
     email = forms.EmailField(required=True, label="Email")
@@ -57,3 +60,55 @@ class ProductForm(forms.ModelForm):
         self.fields['category'].required = False
         for field in self.fields.values():
             field.widget.attrs.update({'class': 'form-control'})
+
+
+class ProductRowForm(forms.ModelForm):
+    """One row of a product import: the ``ProductForm`` rules, category given by name."""
+    category = forms.CharField(max_length=50, required=False)
+
+    class Meta:
+        model = Product
+        fields = ['name', 'description', 'price', 'stock']
+
+
+class ProductImportForm(forms.Form):
+    file = forms.FileField(
+        label="Fichier CSV ou JSONL",
+        help_text="Colonnes : name, description, price, stock, category. "
+                  "Un produit portant déjà ce nom dans la boutique est mis à jour.",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['file'].widget.attrs.update({'class': 'form-control', 'accept': '.csv,.jsonl,.ndjson'})
+
+
+class OrderReportForm(forms.Form):
+    start = forms.DateField(required=False, label="Du", widget=forms.DateInput(attrs={'type': 'date'}))
+    end = forms.DateField(required=False, label="Au", widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for field in self.fields.values():
+            field.widget.attrs.update({'class': 'form-control'})
+
+    def clean(self):
+        cleaned = super().clean()
+        if cleaned.get('start') and cleaned.get('end') and cleaned['end'] < cleaned['start']:
+            raise forms.ValidationError("La date de fin doit suivre la date de début.")
+        return cleaned
+
+
+class ProductSearchForm(forms.Form):
+    q = forms.CharField(max_length=200, required=False, label="Rechercher")
+    shop = forms.IntegerField(required=False, min_value=1, max_value=MAX_ID, widget=forms.HiddenInput)
+    category = forms.IntegerField(required=False, min_value=1, max_value=MAX_ID, widget=forms.HiddenInput)
+    min_price = forms.DecimalField(required=False, min_value=0, label="Prix min")
+    max_price = forms.DecimalField(required=False, min_value=0, label="Prix max")
+    in_stock = forms.BooleanField(required=False, initial=True, label="En stock uniquement")
+    page = forms.IntegerField(required=False, min_value=1, widget=forms.HiddenInput)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['min_price'].widget.attrs.update({'class': 'form-control', 'placeholder': 'Prix min'})
+        self.fields['max_price'].widget.attrs.update({'class': 'form-control', 'placeholder': 'Prix max'})
@@ -0,0 +1,222 @@
+import operator
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from io import BytesIO
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.templatetags.static import static
+from PIL import Image, ImageOps
+
+from .caching import catalogue_changed
+from .models import Product, Shop
+
+DERIVATIVES_DIR = 'derivatives'
+
+# Name -> (width, height, crop). Boxes are twice the CSS size they are shown
+# at, so they stay sharp on high-density screens.
+SIZES = {
+    'thumb':  (120, 120, True),     # cart, dashboard, orders
+    'card':   (480, 360, True),     # product cards
+    'banner': (720, 360, True),     # shop card banners
+    'large':  (1200, 1200, False),  # product page
+}
+
+# Extension -> (Pillow format, save options). WebP is served to browsers
+# that accept it, JPEG is the fallback.
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg':  ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+# Image fields that get derivatives, each with its ``<field>_status`` column.
+IMAGE_FIELDS = [(Product, 'image'), (Shop, 'logo')]
+
+PLACEHOLDER = 'img/placeholder.svg'
+
+
+def derivative_name(name, size, ext):
+    """Storage name of the ``size`` derivative of the stored image ``name``."""
+    return f'{DERIVATIVES_DIR}/{os.path.splitext(name)[0]}/{size}.{ext}'
+
+
+def _resize(image, size):
+    width, height, crop = SIZES[size]
+    if not crop:
+        image = image.copy()
+        image.thumbnail((width, height), Image.LANCZOS)
+        return image
+    # Never upscale: shrink the box instead, keeping its aspect ratio.
+    scale = min(1, image.width / width, image.height / height)
+    box = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return ImageOps.fit(image, box, Image.LANCZOS)
+
+
+def _encode(image, ext):
+    fmt, options = FORMATS[ext]
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        flat = Image.new('RGB', image.size, 'white')
+        rgba = image.convert('RGBA')
+        flat.paste(rgba, mask=rgba.getchannel('A'))
+        image = flat
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    buffer = BytesIO()
+    image.save(buffer, fmt, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def generate(name, sizes=None, storage=default_storage):
+    """Write the derivatives of the stored image ``name`` and return their names.
+
+    Raises ``OSError`` (including ``UnidentifiedImageError``) when the
+    original cannot be read as an image.
+    """
+    with storage.open(name) as original:
+        source = Image.open(original)
+        source.load()
+    source = ImageOps.exif_transpose(source)
+    written = []
+    for size in sizes or SIZES:
+        resized = _resize(source, size)
+        for ext in FORMATS:
+            target = derivative_name(name, size, ext)
+            if storage.exists(target):
+                storage.delete(target)
+            written.append(storage.save(target, _encode(resized, ext)))
+    return written
+
+
+def _catalogue_changed(model, ids):
+    # Status updates bypass the model signals, so cached pages are bumped here.
+    if model is Product:
+        catalogue_changed(Product.objects.filter(pk__in=ids).values_list('shop_id', flat=True), ids)
+    else:
+        catalogue_changed(ids)
+
+
+def _status_field(fieldfile):
+    return f'{fieldfile.field.name}_status'
+
+
+def process(fieldfile):
+    """Handle a freshly uploaded ``ImageField`` value per ``IMAGE_PROCESSING``.
+
+    Called after the commit of any save that uploads an image (see
+    ``core.signals``).
+
+    ``'sync'`` generates the derivatives straight away, which is what tests
+    and development use. ``'queue'`` leaves the row ``pending`` for the
+    ``process_images`` worker, so the upload request returns immediately.
+    """
+    if not fieldfile or getattr(settings, 'IMAGE_PROCESSING', 'sync') != 'sync':
+        return
+    instance = fieldfile.instance
+    try:
+        generate(fieldfile.name, storage=fieldfile.storage)
+        status = 'ready'
+    except (OSError, ValueError):
+        status = 'failed'
+    setattr(instance, _status_field(fieldfile), status)
+    type(instance).objects.filter(pk=instance.pk).update(**{_status_field(fieldfile): status})
+    _catalogue_changed(type(instance), [instance.pk])
+
+
+def _generate_file(name):
+    try:
+        generate(name)
+    except (OSError, ValueError) as exc:
+        return f'{type(exc).__name__}: {exc}'
+    return None
+
+
+def process_pending(workers=None, batch_size=100):
+    """Generate the derivatives of every ``pending`` image and return ``(ready, failed)``.
+
+    Images are decoded and resized in a pool of ``workers`` processes (one
+    per core by default; ``0`` processes them in this process). Only the
+    parent touches the database: it picks a batch of rows, then records
+    every outcome with one UPDATE per status.
+    """
+    counts = {'ready': 0, 'failed': 0}
+    pool = ProcessPoolExecutor(workers, initializer=django.setup) if workers != 0 else None
+    run = pool.map if pool else map
+    try:
+        for model, field in IMAGE_FIELDS:
+            status_field = f'{field}_status'
+            pending = (
+                model.objects.filter(**{status_field: 'pending'})
+                .exclude(**{field: ''}).exclude(**{field: None}).order_by('pk')
+            )
+            last_pk = 0
+            while True:
+                rows = list(pending.filter(pk__gt=last_pk).values_list('pk', field)[:batch_size])
+                if not rows:
+                    break
+                last_pk = rows[-1][0]
+                outcomes = {'ready': [], 'failed': []}
+                for (pk, name), error in zip(rows, run(_generate_file, [name for _, name in rows])):
+                    outcomes['failed' if error else 'ready'].append(Q(pk=pk, **{field: name}))
+                for status, matches in outcomes.items():
+                    if matches:
+                        # A row whose image was replaced meanwhile matches
+                        # nothing and stays pending for the next run.
+                        counts[status] += model.objects.filter(reduce(operator.or_, matches)).update(
+                            **{status_field: status},
+                        )
+                _catalogue_changed(model, [pk for pk, _ in rows])
+    finally:
+        if pool:
+            pool.shutdown()
+    return counts['ready'], counts['failed']
+
+
+def requeue(missing_only=False):
+    """Mark images as ``pending`` again and return how many were queued.
+
+    With ``missing_only``, images whose derivatives are all on disk keep
+    their status.
+    """
+    queued = 0
+    for model, field in IMAGE_FIELDS:
+        rows = model.objects.exclude(**{field: ''}).exclude(**{field: None}).values_list('pk', field)
+        ids = [
+            pk for pk, name in rows.iterator()
+            if not missing_only or not all(
+                default_storage.exists(derivative_name(name, size, ext)) for size in SIZES for ext in FORMATS
+            )
+        ]
+        for start in range(0, len(ids), 500):
+            queued += model.objects.filter(pk__in=ids[start:start + 500]).update(**{f'{field}_status': 'pending'})
+    return queued
+
+
+def derivative_url(fieldfile, size, ext='jpg'):
+    """URL of a derivative, falling back gracefully while it does not exist.
+
+    Pending images keep serving the derivative already on disk, so a
+    ``backfill_images`` run does not blank the catalogue, and show a
+    placeholder only when there is none yet. Failed ones keep serving the
+    original. Ready images whose files went missing are regenerated on
+    first use.
+    """
+    if not fieldfile:
+        return ''
+    status = getattr(fieldfile.instance, _status_field(fieldfile), 'ready')
+    if status == 'failed':
+        return fieldfile.url
+    storage = fieldfile.storage
+    target = derivative_name(fieldfile.name, size, ext)
+    if status == 'pending':
+        return storage.url(target) if storage.exists(target) else static(PLACEHOLDER)
+    if not storage.exists(target):
+        try:
+            generate(fieldfile.name, [size], storage=storage)
+        except (OSError, ValueError):
+            return fieldfile.url
+    return storage.url(target)
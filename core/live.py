@@ -0,0 +1,103 @@
+import asyncio
+import json
+import threading
+from contextlib import contextmanager
+
+from . import notifications
+
+# A stream closes after STREAM_TIMEOUT seconds and the browser reconnects
+# after RETRY_MS, so a dropped server never leaves a connection open for
+# good. HEARTBEAT keeps proxies from closing an idle connection.
+STREAM_TIMEOUT = 300
+HEARTBEAT = 25
+RETRY_MS = 3000
+MAX_PENDING = 100
+
+_subscribers = {}
+_lock = threading.Lock()
+
+
+@contextmanager
+def subscribe(user_id):
+    """Register a queue receiving every event published for ``user_id``.
+
+    Must be entered from the event loop that reads the queue.
+    """
+    entry = (asyncio.get_running_loop(), asyncio.Queue(MAX_PENDING))
+    with _lock:
+        _subscribers.setdefault(user_id, set()).add(entry)
+    try:
+        yield entry[1]
+    finally:
+        with _lock:
+            entries = _subscribers.get(user_id, set())
+            entries.discard(entry)
+            if not entries:
+                _subscribers.pop(user_id, None)
+
+
+def _put(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # Slow client: it still gets the unread count on the next event.
+        pass
+
+
+def publish(user_id, event=None):
+    """Hand ``event`` to the streams open in this process for ``user_id``.
+
+    Safe to call from any thread. ``None`` only means that the unread
+    count changed.
+    """
+    with _lock:
+        entries = list(_subscribers.get(user_id, ()))
+    for loop, queue in entries:
+        try:
+            loop.call_soon_threadsafe(_put, queue, event)
+        except RuntimeError:
+            pass  # Loop already closed; the stream is going away.
+
+
+def notification_event(notif):
+    return {
+        'id': notif.pk, 'type': notif.notif_type, 'label': notif.get_notif_type_display(),
+        'message': notif.message, 'order': notif.order_id,
+        'created_at': notif.created_at.isoformat() if notif.created_at else None,
+    }
+
+
+def _event(name, data):
+    return f'event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+async def stream(user, timeout=STREAM_TIMEOUT, heartbeat=HEARTBEAT):
+    """Yield Server-Sent Events for ``user``: new notifications and the unread count.
+
+    The count is sent on connection and again whenever it changes. Events
+    published while several are pending are sent together, followed by a
+    single recount.
+    """
+    loop = asyncio.get_running_loop()
+    yield f'retry: {RETRY_MS}\n\n'
+    with subscribe(user.pk) as queue:
+        unread = await notifications.aunread_count(user)
+        yield _event('unread', {'unread': unread})
+        deadline = loop.time() + timeout
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                events = [await asyncio.wait_for(queue.get(), min(heartbeat, remaining))]
+            except asyncio.TimeoutError:
+                # Deliveries from other processes are not published here;
+                # the heartbeat picks up the counter they updated.
+                events = []
+                yield ': ping\n\n'
+            while not queue.empty():
+                events.append(queue.get_nowait())
+            for event in events:
+                if event is not None:
+                    yield _event('notification', event)
+            count = await notifications.aunread_count(user)
+            if count != unread:
+                unread = count
+                yield _event('unread', {'unread': unread})
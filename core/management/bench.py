@@ -0,0 +1,38 @@
+import threading
+import time
+
+from django.db import connection
+
+
+def run_concurrently(clients, send, count):
+    """Make ``count`` requests with each client, one thread per client, and
+    return ``(elapsed, errors)``.
+
+    ``send(client, i)`` makes the i-th request and returns its response; an
+    error status or an exception counts as an error. The clock starts once
+    every thread is ready, and each thread closes its own connection.
+    """
+    errors = []
+    barrier = threading.Barrier(len(clients) + 1)
+
+    def worker(client):
+        barrier.wait()
+        try:
+            for i in range(count):
+                try:
+                    response = send(client, i)
+                    if response.status_code >= 400:
+                        errors.append(response.status_code)
+                except Exception as exc:
+                    errors.append(exc)
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker, args=(client,)) for client in clients]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - start, len(errors)
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from core.images import process_pending, requeue
+
+
+class Command(BaseCommand):
+    help = "Régénère les dérivés de toutes les images existantes de media/, en parallèle sur tous les cœurs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing-only', action='store_true',
+                            help='Ne traiter que les images dont un dérivé manque sur le disque.')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Nombre de processus (défaut : un par cœur).')
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, missing_only=False, workers=None, batch_size=100, **options):
+        queued = requeue(missing_only=missing_only)
+        self.stdout.write(f'{queued} image(s) à traiter.')
+        ready, failed = process_pending(workers=workers, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'{ready} image(s) traitée(s), {failed} en échec.'))
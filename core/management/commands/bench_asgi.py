@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from core.management.bench import run_concurrently
+from core.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le débit des pages publiques servies par le gestionnaire WSGI (threads) "
+        "et par le gestionnaire ASGI (tâches asyncio), dans ce processus."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400,
+                            help='Nombre total de requêtes par gestionnaire.')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='Threads WSGI ou tâches ASGI simultanés.')
+        parser.add_argument('--user', default=None,
+                            help="Utilisateur connecté (défaut : anonyme, donc pages servies par le cache).")
+
+    def handle(self, *args, requests=400, concurrency=8, user=None, **options):
+        product = Product.objects.filter(stock__gt=0).select_related('shop').first()
+        if product is None:
+            raise CommandError('Aucun produit en stock pour le benchmark.')
+        if user is not None:
+            try:
+                user = User.objects.get(username=user)
+            except User.DoesNotExist:
+                raise CommandError(f'Utilisateur « {user} » introuvable.')
+        urls = [
+            reverse('home'), reverse('shop_list'),
+            reverse('shop_detail', args=[product.shop_id]), reverse('product_detail', args=[product.pk]),
+        ]
+        if user is not None:
+            urls.append(reverse('unread_notifications'))
+
+        self.stdout.write(f'{requests} requêtes par gestionnaire, concurrence {concurrency}, '
+                          f'{"utilisateur " + user.username if user else "anonyme"}')
+        for name, run in [('wsgi', self.run_wsgi), ('asgi', self.run_asgi)]:
+            elapsed, errors = run(urls, user, requests, concurrency)
+            self.stdout.write(
+                f'{name} : {requests / elapsed:8.1f} req/s'
+                f'  ({elapsed:.2f} s, {errors} erreur(s))'
+            )
+
+    def run_wsgi(self, urls, user, requests, concurrency):
+        clients = [Client() for _ in range(concurrency)]
+        if user is not None:
+            for client in clients:
+                client.force_login(user)
+        return run_concurrently(clients, lambda client, i: client.get(urls[i % len(urls)]), requests // concurrency)
+
+    def run_asgi(self, urls, user, requests, concurrency):
+        errors = []
+
+        async def worker(client, count):
+            for i in range(count):
+                try:
+                    response = await client.get(urls[i % len(urls)])
+                    if response.status_code >= 400:
+                        errors.append(response.status_code)
+                except Exception as exc:
+                    errors.append(exc)
+
+        async def main():
+            clients = [AsyncClient() for _ in range(concurrency)]
+            if user is not None:
+                for client in clients:
+                    await client.aforce_login(user)
+            start = time.perf_counter()
+            await asyncio.gather(*(worker(client, requests // concurrency) for client in clients))
+            return time.perf_counter() - start
+
+        return async_to_sync(main)(), len(errors)
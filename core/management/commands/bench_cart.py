@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.management.bench import run_concurrently
+from core.models import Product
+
+
+class Command(BaseCommand):
+    help = "Mesure le débit ajout/retrait panier pour chaque mode de stockage des sessions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400,
+                            help='Nombre total de requêtes par mode.')
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--product', type=int, default=None,
+                            help='Produit à ajouter (défaut : le premier produit en stock).')
+        parser.add_argument('--modes', nargs='+', default=list(settings.SESSION_ENGINES),
+                            choices=list(settings.SESSION_ENGINES))
+
+    def handle(self, *args, requests=400, threads=4, product=None, modes=None, **options):
+        products = Product.objects.filter(stock__gt=0)
+        if product is not None:
+            products = products.filter(pk=product)
+        product = products.first()
+        if product is None:
+            raise CommandError('Aucun produit en stock pour le benchmark.')
+
+        self.stdout.write(f'{requests} requêtes par mode, {threads} thread(s), produit #{product.pk}')
+        for mode in modes:
+            with override_settings(
+                SESSION_ENGINE=settings.SESSION_ENGINES[mode],
+                SESSION_CACHE_ALIAS='memory_sessions' if mode == 'memory' else 'sessions',
+            ):
+                elapsed, errors = self.run_mode(product, requests, threads)
+            self.stdout.write(
+                f'{mode:>7} : {requests / elapsed:8.1f} req/s'
+                f'  ({elapsed:.2f} s, {errors} erreur(s))'
+            )
+
+    def run_mode(self, product, requests, threads):
+        add_url = reverse('add_to_cart', args=[product.pk])
+        remove_url = reverse('remove_from_cart', args=[product.pk])
+        clients = [Client() for _ in range(threads)]
+        result = run_concurrently(
+            clients, lambda client, i: client.post(add_url if i % 2 == 0 else remove_url), requests // threads,
+        )
+        for client in clients:
+            client.logout()
+        return result
@@ -0,0 +1,86 @@
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from core.management.bench import run_concurrently
+from core.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le débit de commandes concurrentes (ajout au panier puis validation) "
+        "pour chaque profil SQLite, sur une copie de la base."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200,
+                            help='Nombre total de commandes par profil.')
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--profiles', nargs='+', default=list(settings.SQLITE_PROFILES),
+                            choices=list(settings.SQLITE_PROFILES))
+
+    def handle(self, *args, orders=200, threads=8, profiles=None, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Ce benchmark ne concerne que SQLite.')
+        product = Product.objects.filter(stock__gt=0).first()
+        if product is None:
+            raise CommandError('Aucun produit en stock pour le benchmark.')
+
+        self.stdout.write(f'{orders} commandes par profil, {threads} thread(s), produit #{product.pk}')
+        db = connections.settings['default']
+        original = dict(db)
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in profiles:
+                path = Path(tmp) / f'{name}.sqlite3'
+                self.copy_database(original['NAME'], path)
+                profile = settings.SQLITE_PROFILES[name]
+                connections.close_all()
+                db.update(
+                    NAME=path,
+                    OPTIONS=profile['DATABASE'].get('OPTIONS', {}),
+                    CONN_MAX_AGE=profile['DATABASE'].get('CONN_MAX_AGE', 0),
+                    CONN_HEALTH_CHECKS=profile['DATABASE'].get('CONN_HEALTH_CHECKS', False),
+                )
+                try:
+                    with override_settings(SQLITE_PRAGMAS=profile['PRAGMAS']):
+                        elapsed, errors = self.run_profile(product.pk, orders, threads)
+                finally:
+                    connections.close_all()
+                    db.clear()
+                    db.update(original)
+                self.stdout.write(
+                    f'{name:>10} : {orders / elapsed:8.1f} commandes/s'
+                    f'  ({elapsed:.2f} s, {errors} erreur(s))'
+                )
+
+    def copy_database(self, source, target):
+        src, dst = sqlite3.connect(source), sqlite3.connect(target)
+        try:
+            src.backup(dst)
+            dst.execute('PRAGMA journal_mode = DELETE')
+        finally:
+            src.close()
+            dst.close()
+
+    def run_profile(self, product_id, orders, threads):
+        Product.objects.filter(pk=product_id).update(stock=orders * 10)
+        clients = []
+        for i in range(threads):
+            client = Client()
+            client.force_login(User.objects.get_or_create(username=f'bench-buyer-{i}')[0])
+            clients.append(client)
+        add_url = reverse('add_to_cart', args=[product_id])
+        checkout_url = reverse('checkout')
+
+        def order(client, i):
+            client.post(add_url)
+            return client.post(checkout_url)
+
+        return run_concurrently(clients, order, orders // threads)
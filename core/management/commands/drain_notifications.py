@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.notifications import drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Livre les notifications en attente dans NotificationOutbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--loop', action='store_true',
+                            help="Continuer à vider la file au lieu de s'arrêter quand elle est vide.")
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Pause en secondes entre deux passages avec --loop.')
+
+    def handle(self, *args, batch_size=None, loop=False, interval=1.0, **options):
+        while True:
+            moved = drain_outbox(batch_size)
+            if moved or not loop:
+                self.stdout.write(f'{moved} notification(s) livrée(s).')
+            if not loop:
+                return
+            time.sleep(interval)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Shop
+from core.product_io import FORMATS, detect_format, import_products
+
+
+class Command(BaseCommand):
+    help = "Importe un catalogue CSV ou JSONL dans une boutique (création ou mise à jour par nom)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('shop', type=int, help='Identifiant de la boutique.')
+        parser.add_argument('path', help='Fichier CSV ou JSONL à importer.')
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help="Format du fichier (défaut : d'après l'extension).")
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, shop, path, format=None, batch_size=None, **options):
+        try:
+            shop = Shop.objects.get(pk=shop)
+        except Shop.DoesNotExist:
+            raise CommandError(f'Boutique #{shop} introuvable.')
+        with open(path, 'rb') as stream:
+            report = import_products(shop, stream, format or detect_format(path), batch_size)
+        for line, message in report.errors:
+            self.stderr.write(f'Ligne {line} : {message}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{report.created} produit(s) créé(s), {report.updated} mis à jour, {report.failed} ligne(s) ignorée(s).'
+        ))
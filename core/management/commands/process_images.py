@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.images import process_pending
+
+
+class Command(BaseCommand):
+    help = "Génère les vignettes et variantes WebP des images en attente."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Nombre de processus (défaut : un par cœur, 0 : aucun).')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true',
+                            help="Continuer à surveiller la file au lieu de s'arrêter quand elle est vide.")
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Pause en secondes entre deux passages avec --loop.')
+
+    def handle(self, *args, workers=None, batch_size=100, loop=False, interval=2.0, **options):
+        while True:
+            ready, failed = process_pending(workers=workers, batch_size=batch_size)
+            if ready or failed or not loop:
+                self.stdout.write(f'{ready} image(s) traitée(s), {failed} en échec.')
+            if not loop:
+                return
+            time.sleep(interval)
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.notifications import purge_read
+
+
+class Command(BaseCommand):
+    help = "Supprime les notifications lues plus anciennes que la durée de rétention."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Âge minimum en jours (défaut : NOTIFICATION_RETENTION_DAYS).')
+        parser.add_argument('--archive', metavar='FICHIER',
+                            help='Ajouter les notifications supprimées à ce fichier JSONL.')
+        parser.add_argument('--batch-size', type=int, default=None)
+
+    def handle(self, *args, days=None, archive=None, batch_size=None, **options):
+        days = days if days is not None else getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90)
+        if archive:
+            with open(archive, 'a', encoding='utf-8') as fh:
+                purged = purge_read(days, batch_size, archive=fh)
+        else:
+            purged = purge_read(days, batch_size)
+        self.stdout.write(self.style.SUCCESS(f'{purged} notification(s) supprimée(s).'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Shop
+from core.stats import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recalcule la table ShopDailyStats à partir de l'historique des commandes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shop', type=int, action='append', dest='shops',
+                            help='Limiter le recalcul à cette boutique (répétable).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, shops=None, batch_size=1000, **options):
+        if shops:
+            shops = Shop.objects.filter(pk__in=shops)
+        written = rebuild(shops=shops, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f'{written} ligne(s) de statistiques reconstruite(s).'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = "Recompte les totaux du site (produits, boutiques, utilisateurs, ventes) et corrige les écarts."
+
+    def handle(self, *args, **options):
+        drift = reconcile()
+        for name, delta in drift.items():
+            self.stdout.write(f'{name:>16} : {delta:+d}')
+        if any(drift.values()):
+            self.stdout.write(self.style.WARNING('Compteurs corrigés.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Compteurs à jour.'))
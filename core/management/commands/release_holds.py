@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.reservations import release_expired
+
+
+class Command(BaseCommand):
+    help = "Libère les réservations de stock expirées des paniers."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true',
+                            help="Continuer à libérer au lieu de s'arrêter après un passage.")
+        parser.add_argument('--interval', type=float, default=60.0,
+                            help='Pause en secondes entre deux passages avec --loop.')
+
+    def handle(self, *args, batch_size=1000, loop=False, interval=60.0, **options):
+        while True:
+            released = release_expired(batch_size)
+            if released or not loop:
+                self.stdout.write(f'{released} réservation(s) libérée(s).')
+            if not loop:
+                return
+            time.sleep(interval)
@@ -0,0 +1,52 @@
+import sqlite3
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.caching import REPLICA, bump
+from core.routers import replica_alias
+
+
+class Command(BaseCommand):
+    help = "Recopie la base principale SQLite dans la réplique en lecture (REPLICA_PATH)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=None, help='Base principale (défaut : DATABASES).')
+        parser.add_argument('--target', default=None, help='Réplique (défaut : DATABASES).')
+        parser.add_argument('--loop', action='store_true',
+                            help="Recopier à chaque modification au lieu de s'arrêter après une copie.")
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Pause en secondes entre deux vérifications avec --loop.')
+
+    def handle(self, *args, source=None, target=None, loop=False, interval=2.0, **options):
+        source = source or connections.settings[DEFAULT_DB_ALIAS]['NAME']
+        if target is None:
+            if not replica_alias():
+                raise CommandError("Aucune réplique configurée (variable REPLICA_PATH).")
+            target = connections.settings[replica_alias()]['NAME']
+
+        primary = sqlite3.connect(source)
+        last_version = None
+        try:
+            while True:
+                # data_version changes whenever another connection commits.
+                version = primary.execute('PRAGMA data_version').fetchone()[0]
+                if version != last_version:
+                    self.copy(primary, target)
+                    last_version = version
+                    # Pages and fragments built from the old copy are dropped.
+                    bump([REPLICA])
+                    self.stdout.write(f'Réplique {target} à jour.')
+                if not loop:
+                    return
+                time.sleep(interval)
+        finally:
+            primary.close()
+
+    def copy(self, primary, target):
+        replica = sqlite3.connect(target)
+        try:
+            primary.backup(replica)
+        finally:
+            replica.close()
@@ -0,0 +1,63 @@
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+from .routers import replica_reads, resume_reads
+
+STICKY_COOKIE = 'primary_reads'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def _replica_allowed(request):
+    return request.method in SAFE_METHODS and STICKY_COOKIE not in request.COOKIES
+
+
+def _stick(response, state):
+    # Read-your-writes: the replica may lag behind what this browser just
+    # wrote, so its next requests read the primary for a while.
+    if state.wrote:
+        response.set_cookie(
+            STICKY_COOKIE, '1', max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 10),
+            httponly=True, samesite='Lax',
+        )
+    return response
+
+
+def _streamed(content, state):
+    # A streamed response (exports, report downloads) runs its queries while
+    # it is sent, after the view has returned: each chunk is produced under
+    # the request's routing. The state is set per chunk because the server
+    # may pull them from another context.
+    chunks = iter(content)
+    while True:
+        with resume_reads(state):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def _finish(response, state):
+    if response.streaming and not response.is_async:
+        response.streaming_content = _streamed(response.streaming_content, state)
+    return _stick(response, state)
+
+
+@sync_and_async_middleware
+def replica_middleware(get_response):
+    """Route the reads of safe requests to the replica (see ``core.routers``).
+
+    POST requests (order status updates…), browsers that wrote recently and
+    views marked ``primary_reads`` (cart, checkout) stay on the primary.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            with replica_reads(_replica_allowed(request)) as state:
+                response = await get_response(request)
+            return _finish(response, state)
+    else:
+        def middleware(request):
+            with replica_reads(_replica_allowed(request)) as state:
+                response = get_response(request)
+            return _finish(response, state)
+    return middleware
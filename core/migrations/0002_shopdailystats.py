@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('orders', models.IntegerField(default=0)),
+                ('pending', models.IntegerField(default=0)),
+                ('processing', models.IntegerField(default=0)),
+                ('shipped', models.IntegerField(default=0)),
+                ('delivered', models.IntegerField(default=0)),
+                ('cancelled', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('units_sold', models.IntegerField(default=0)),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.shop')),
+            ],
+            options={
+                'verbose_name_plural': 'shop daily stats',
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('shop', 'day'), name='unique_shop_day_stats')],
+            },
+        ),
+    ]
@@ -0,0 +1,71 @@
+from django.db import migrations
+
+# FTS5 full-text index on Product.name, Product.description and
+# Category.name, kept up to date by SQLite triggers (including for
+# bulk_create and QuerySet.update, which send no signals).
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE core_product_fts USING fts5(
+        name, description, category, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER core_product_fts_insert AFTER INSERT ON core_product BEGIN
+        INSERT INTO core_product_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description,
+                COALESCE((SELECT name FROM core_category WHERE id = new.category_id), ''));
+    END
+    """,
+    """
+    CREATE TRIGGER core_product_fts_update AFTER UPDATE OF name, description, category_id ON core_product BEGIN
+        UPDATE core_product_fts
+        SET name = new.name, description = new.description,
+            category = COALESCE((SELECT name FROM core_category WHERE id = new.category_id), '')
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER core_product_fts_delete AFTER DELETE ON core_product BEGIN
+        DELETE FROM core_product_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER core_category_fts_update AFTER UPDATE OF name ON core_category BEGIN
+        UPDATE core_product_fts SET category = new.name
+        WHERE rowid IN (SELECT id FROM core_product WHERE category_id = new.id);
+    END
+    """,
+    """
+    INSERT INTO core_product_fts(rowid, name, description, category)
+    SELECT p.id, p.name, p.description, COALESCE(c.name, '')
+    FROM core_product p LEFT JOIN core_category c ON c.id = p.category_id
+    """,
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS core_category_fts_update',
+    'DROP TRIGGER IF EXISTS core_product_fts_delete',
+    'DROP TRIGGER IF EXISTS core_product_fts_update',
+    'DROP TRIGGER IF EXISTS core_product_fts_insert',
+    'DROP TABLE IF EXISTS core_product_fts',
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE_SQL), run(DROP_SQL)),
+    ]
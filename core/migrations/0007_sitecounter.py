@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:34
+
+from django.db import migrations, models
+
+
+def seed_counters(apps, schema_editor):
+    SiteCounter = apps.get_model('core', 'SiteCounter')
+    User = apps.get_model('auth', 'User')
+    Product = apps.get_model('core', 'Product')
+    Shop = apps.get_model('core', 'Shop')
+    Order = apps.get_model('core', 'Order')
+    SiteCounter.objects.bulk_create([
+        SiteCounter(name='products', value=Product.objects.count()),
+        SiteCounter(name='shops', value=Shop.objects.count()),
+        SiteCounter(name='users', value=User.objects.count()),
+        SiteCounter(name='delivered_orders', value=Order.objects.filter(status='delivered').count()),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0006_catalogue_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteCounter',
+            fields=[
+                ('name', models.CharField(max_length=30, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:36
+
+import importlib
+
+from django.db import migrations, models
+
+# SQLite adds these columns by rebuilding core_product, which the search
+# triggers of 0005 refer to: drop them around the rebuild and put them back.
+search_index = importlib.import_module('core.migrations.0005_product_search_index')
+CREATE_TRIGGERS = [sql for sql in search_index.CREATE_SQL if 'CREATE TRIGGER' in sql]
+DROP_TRIGGERS = [sql for sql in search_index.DROP_SQL if 'DROP TRIGGER' in sql]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_sitecounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(search_index.run(DROP_TRIGGERS), search_index.run(CREATE_TRIGGERS)),
+        migrations.AddField(
+            model_name='product',
+            name='image_status',
+            field=models.CharField(choices=[('pending', 'En attente'), ('ready', 'Prête'), ('failed', 'Échec')], default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='shop',
+            name='logo_status',
+            field=models.CharField(choices=[('pending', 'En attente'), ('ready', 'Prête'), ('failed', 'Échec')], default='pending', max_length=10),
+        ),
+        migrations.RunPython(search_index.run(CREATE_TRIGGERS), search_index.run(DROP_TRIGGERS)),
+    ]
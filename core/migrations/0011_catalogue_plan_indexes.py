@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_stockreservation_created_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_shop_stock_idx',
+        ),
+        migrations.AddIndex(
+            model_name='shop',
+            index=models.Index(fields=['created_at', 'id'], name='shop_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shop',
+            index=models.Index(fields=['name', 'id'], name='shop_name_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_shop_owners(apps, schema_editor):
+    Order = apps.get_model('core', 'Order')
+    Shop = apps.get_model('core', 'Shop')
+    Order.objects.update(seller=models.Subquery(
+        Shop.objects.filter(pk=models.OuterRef('shop')).values('owner')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_catalogue_plan_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='seller',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sales', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(copy_shop_owners, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='order',
+            name='seller',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['seller', 'created_at'], name='order_seller_recent_idx'),
+        ),
+    ]
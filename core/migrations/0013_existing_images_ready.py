@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:30
+
+from django.db import migrations
+
+IMAGE_FIELDS = [('Product', 'image'), ('Shop', 'logo')]
+
+
+def mark_existing_ready(apps, schema_editor):
+    # 0008 left every image pending, so pages showed the placeholder. The
+    # derivatives of ready images are made on first display if missing.
+    for model_name, field in IMAGE_FIELDS:
+        model = apps.get_model('core', model_name)
+        model.objects.filter(**{f'{field}_status': 'pending'}).exclude(**{field: ''}).exclude(
+            **{field: None},
+        ).update(**{f'{field}_status': 'ready'})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_order_seller'),
+    ]
+
+    operations = [
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,89 @@
+from datetime import date, datetime, time
+
 from django.db import models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+
+def last_months(count, today=None):
+    """Return the first day of each of the last ``count`` calendar months, oldest first."""
+    today = today or timezone.localdate()
+    year, month = today.year, today.month
+    months = []
+    for _ in range(count):
+        months.append(date(year, month, 1))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return months[::-1]
+
+
+ORDER_STATUS_CHOICES = [
+    ('pending',    'En attente'),
+    ('processing', 'En préparation'),
+    ('shipped',    'Expédiée'),
+    ('delivered',  'Livrée'),
+    ('cancelled',  'Annulée'),
+]
+
+
+class StatsQuerySet(models.QuerySet):
+    """Order statistics in at most two queries: ``summary()`` and ``monthly_series()``.
+
+    Subclasses declare the column that dates a row, the aggregates of
+    ``summary()`` and the one ``monthly_series()`` counts, so the same calls
+    work on raw orders and on the daily rollup.
+    """
+    date_field = None
+    summary_aggregates = {}
+    count_aggregate = None
+
+    def summary(self):
+        return self.order_by().aggregate(**self.summary_aggregates)
+
+    def monthly_series(self, months=12, today=None):
+        starts = last_months(months, today)
+        since = starts[0]
+        if isinstance(self.model._meta.get_field(self.date_field), models.DateTimeField):
+            since = timezone.make_aware(datetime.combine(since, time.min))
+        rows = (
+            self.order_by()
+            .filter(**{f'{self.date_field}__gte': since})
+            .annotate(month=TruncMonth(self.date_field))
+            .values('month')
+            .annotate(count=self.count_aggregate)
+        )
+        counts = {(row['month'].year, row['month'].month): row['count'] for row in rows}
+        labels = [start.strftime('%b') for start in starts]
+        return labels, [counts.get((start.year, start.month), 0) for start in starts]
+
+
+class OrderStatsQuerySet(StatsQuerySet):
+    date_field = 'created_at'
+    summary_aggregates = {
+        'total_orders': Count('id'),
+        'total_revenue': Sum('total', filter=Q(status='delivered'), default=0),
+        **{f'{status}_orders': Count('id', filter=Q(status=status)) for status, _ in ORDER_STATUS_CHOICES},
+    }
+    count_aggregate = Count('id')
+
+
+class ShopDailyStatsQuerySet(StatsQuerySet):
+    date_field = 'day'
+    summary_aggregates = {
+        'total_orders': Sum('orders', default=0),
+        'total_revenue': Sum('revenue', default=0),
+        **{f'{status}_orders': Sum(status, default=0) for status, _ in ORDER_STATUS_CHOICES},
+    }
+    count_aggregate = Sum('orders')
+
+
+# State of the image derivatives (thumbnails, WebP) made by ``core.images``.
+IMAGE_STATUS_CHOICES = [
+    ('pending', 'En attente'),
+    ('ready',   'Prête'),
+    ('failed',  'Échec'),
+]
 
 
 class Shop(models.Model):
@@ -8,12 +92,18 @@ class Shop(models.Model):
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     logo = models.ImageField(upload_to='shops/', blank=True, null=True)
+    logo_status = models.CharField(max_length=10, choices=IMAGE_STATUS_CHOICES, default='pending')
 
     def __str__(self):
         return self.name
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Sorts of the shop list (see SHOP_SORTS in core.views).
+            models.Index(fields=['created_at', 'id'], name='shop_recent_idx'),
+            models.Index(fields=['name', 'id'], name='shop_name_idx'),
+        ]
 
 
 class Category(models.Model):
@@ -36,6 +126,7 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    image_status = models.CharField(max_length=10, choices=IMAGE_STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -44,27 +135,47 @@ class Product(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        # No index may cover both shop and stock: without ANALYZE statistics,
+        # SQLite would prefer it to the sort indexes below and sort every
+        # in-stock product of the shop for each catalogue page.
+        indexes = [
+            models.Index(fields=['created_at'], condition=Q(stock__gt=0), name='product_in_stock_recent_idx'),
+            models.Index(fields=['shop', 'created_at'], condition=Q(stock__gt=0), name='product_shop_recent_idx'),
+            models.Index(fields=['shop', 'price'], condition=Q(stock__gt=0), name='product_shop_price_idx'),
+            models.Index(fields=['shop', 'name'], condition=Q(stock__gt=0), name='product_shop_name_idx'),
+        ]
 
 
 class Order(models.Model):
-    STATUS_CHOICES = [
-        ('pending',    'En attente'),
-        ('processing', 'En préparation'),
-        ('shipped',    'Expédiée'),
-        ('delivered',  'Livrée'),
-        ('cancelled',  'Annulée'),
-    ]
+    STATUS_CHOICES = ORDER_STATUS_CHOICES
     customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
     shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='orders')
+    # Owner of the shop, copied so the dashboard pages through a seller's
+    # orders of every shop in date order from a single index. Kept in step
+    # with Shop.owner by core.signals.
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sales')
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
 
+    objects = OrderStatsQuerySet.as_manager()
+
     def __str__(self):
         return f"Commande #{self.id} — {self.customer.username}"
 
+    def save(self, *args, **kwargs):
+        if self.seller_id is None:
+            self.seller_id = self.shop.owner_id
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['shop', 'status'], name='order_shop_status_idx'),
+            models.Index(fields=['shop', 'created_at'], name='order_shop_created_idx'),
+            models.Index(fields=['customer', 'created_at'], name='order_customer_recent_idx'),
+            models.Index(fields=['seller', 'created_at'], name='order_seller_recent_idx'),
+        ]
 
 
 class OrderItem(models.Model):
@@ -80,6 +191,33 @@ class OrderItem(models.Model):
         return f"{self.quantity} × {self.product.name}"
 
 
+class StockReservation(models.Model):
+    """Quantity of a product held by one cart until ``expires_at``.
+
+    ``Product.stock`` stays the physical stock until checkout; what can
+    still be added to a cart is the stock minus the active holds of other
+    carts (see ``core.reservations``).
+    """
+    product    = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    holder     = models.CharField(max_length=32)
+    quantity   = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['holder', 'product'], name='reservation_holder_product_uniq'),
+        ]
+        indexes = [
+            # Covers SUM(quantity) of a product's active holds.
+            models.Index(fields=['product', 'expires_at', 'quantity'], name='reservation_product_active_idx'),
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} × {self.product_id} pour {self.holder}"
+
+
 class Notification(models.Model):
     NOTIF_TYPES = [
         ('new_order',     'Nouvelle commande'),
@@ -96,6 +234,68 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', 'is_read'], name='notif_recipient_read_idx'),
+            models.Index(fields=['recipient', 'created_at'], name='notif_recipient_recent_idx'),
+        ]
 
     def __str__(self):
         return f"Notif → {self.recipient.username} : {self.message[:40]}"
+
+
+class ShopDailyStats(models.Model):
+    """Per-shop, per-day rollup of orders, kept up to date by ``core.stats``.
+
+    Orders are attributed to the day they were placed; a status change moves
+    the order from one status column to another on that same row.
+    """
+    shop        = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='daily_stats')
+    day         = models.DateField()
+    orders      = models.IntegerField(default=0)
+    pending     = models.IntegerField(default=0)
+    processing  = models.IntegerField(default=0)
+    shipped     = models.IntegerField(default=0)
+    delivered   = models.IntegerField(default=0)
+    cancelled   = models.IntegerField(default=0)
+    revenue     = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    units_sold  = models.IntegerField(default=0)
+
+    objects = ShopDailyStatsQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = 'shop daily stats'
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'day'], name='unique_shop_day_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.shop.name} — {self.day}"
+
+
+class NotificationOutbox(models.Model):
+    """Notification waiting to be delivered by the ``drain_notifications`` worker."""
+    recipient  = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    notif_type = models.CharField(max_length=30, choices=Notification.NOTIF_TYPES)
+    order      = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='+', null=True, blank=True)
+    message    = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Outbox → {self.recipient_id} : {self.message[:40]}"
+
+
+class SiteCounter(models.Model):
+    """Site-wide total kept up to date by ``core.counters``.
+
+    Increments can drift if rows are written behind the ORM's back; the
+    ``reconcile_counters`` command recounts and corrects them.
+    """
+    name  = models.CharField(max_length=30, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
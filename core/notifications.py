@@ -0,0 +1,140 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import live
+from .routers import reading_replica
+from .models import Notification, NotificationOutbox
+
+UNREAD_TIMEOUT = 300
+
+
+def _unread_key(user_id):
+    return f'unread_notifs:{user_id}'
+
+
+def unread_count(user):
+    """Number of unread notifications for ``user``, from cache when possible.
+
+    A count read from the replica may lag, so it is not cached: ``add_unread``
+    would then keep shifting a stale value.
+    """
+    key = _unread_key(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(recipient=user, is_read=False).count()
+        if not reading_replica():
+            cache.set(key, count, UNREAD_TIMEOUT)
+    return count
+
+
+async def aunread_count(user):
+    key = _unread_key(user.pk)
+    count = await cache.aget(key)
+    if count is None:
+        count = await Notification.objects.filter(recipient=user, is_read=False).acount()
+        if not reading_replica():
+            await cache.aset(key, count, UNREAD_TIMEOUT)
+    return count
+
+
+def add_unread(user_ids, delta=1):
+    """Shift the cached counter of every user in ``user_ids`` by ``delta``.
+
+    Missing keys are left alone: the next ``unread_count`` reloads them
+    from the database, so the cache never needs to be primed here. Open
+    notification streams are told to resend the count.
+    """
+    for user_id in user_ids:
+        try:
+            if cache.incr(_unread_key(user_id), delta) < 0:
+                cache.delete(_unread_key(user_id))
+        except ValueError:
+            pass
+        live.publish(user_id)
+
+
+def _batch_size():
+    return getattr(settings, 'NOTIFICATION_BATCH_SIZE', 500)
+
+
+def deliver(notifications):
+    """Insert ``notifications``, then bump their recipients' unread counters
+    and push them to open notification streams once the transaction commits."""
+    Notification.objects.bulk_create(notifications, batch_size=_batch_size())
+    transaction.on_commit(lambda: _delivered(notifications))
+
+
+def _delivered(notifications):
+    for notif in notifications:
+        live.publish(notif.recipient_id, live.notification_event(notif))
+    add_unread([notif.recipient_id for notif in notifications])
+
+
+def queue(notifications):
+    """Hand ``notifications`` to the configured delivery mode.
+
+    ``NOTIFICATION_DELIVERY = 'sync'`` writes them straight away, which is
+    what tests and development use. ``'outbox'`` only records them in
+    ``NotificationOutbox`` and leaves delivery to ``drain_notifications``.
+    Either way the whole list is written in one bulk insert.
+    """
+    if not notifications:
+        return
+    if getattr(settings, 'NOTIFICATION_DELIVERY', 'sync') == 'outbox':
+        NotificationOutbox.objects.bulk_create([
+            NotificationOutbox(
+                recipient_id=notif.recipient_id, notif_type=notif.notif_type,
+                order_id=notif.order_id, message=notif.message,
+            )
+            for notif in notifications
+        ], batch_size=_batch_size())
+    else:
+        deliver(notifications)
+
+
+def drain_outbox(batch_size=None):
+    """Move pending outbox rows into ``Notification`` and return how many were moved."""
+    batch_size = batch_size or _batch_size()
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(NotificationOutbox.objects.order_by('pk')[:batch_size])
+            if not rows:
+                return moved
+            deliver([
+                Notification(
+                    recipient_id=row.recipient_id, notif_type=row.notif_type,
+                    order_id=row.order_id, message=row.message,
+                )
+                for row in rows
+            ])
+            NotificationOutbox.objects.filter(pk__in=[row.pk for row in rows]).delete()
+        moved += len(rows)
+
+
+def purge_read(days, batch_size=None, archive=None):
+    """Delete read notifications older than ``days`` and return how many went.
+
+    Rows are removed in batches so the table is never locked for long. When
+    ``archive`` is an open text file, each row is first written to it as a
+    JSON line.
+    """
+    batch_size = batch_size or _batch_size()
+    old = Notification.objects.filter(is_read=True, created_at__lt=timezone.now() - timedelta(days=days))
+    fields = ['id', 'recipient_id', 'notif_type', 'order_id', 'message', 'created_at']
+    purged = 0
+    while True:
+        with transaction.atomic():
+            rows = list(old.order_by('pk').values(*fields)[:batch_size])
+            if not rows:
+                return purged
+            if archive is not None:
+                for row in rows:
+                    archive.write(json.dumps(row, default=str, ensure_ascii=False) + '\n')
+            Notification.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+        purged += len(rows)
@@ -0,0 +1,67 @@
+from django.db import transaction
+
+from .caching import orders_changed
+from .models import Order, Notification
+from .notifications import queue
+from .stats import STATUSES, record_status_changes
+
+STATUS_MESSAGES = {
+    'processing': 'Votre commande #{id} de « {shop} » est en cours de préparation.',
+    'shipped':    'Votre commande #{id} de « {shop} » a été expédiée ! 🚚',
+    'delivered':  'Votre commande #{id} de « {shop} » a été livrée. Merci ! 🎉',
+    'cancelled':  'Votre commande #{id} de « {shop} » a été annulée.',
+}
+
+
+def status_notification(order, shop_name, new_status):
+    """Customer notification for ``order`` reaching ``new_status``, or ``None``."""
+    if new_status not in STATUS_MESSAGES:
+        return None
+    return Notification(
+        recipient_id=order.customer_id,
+        notif_type=f'order_{new_status}',
+        order=order,
+        message=STATUS_MESSAGES[new_status].format(id=order.id, shop=shop_name),
+    )
+
+
+def bulk_update_status(owner, order_ids, new_status):
+    """Set ``new_status`` on every order of ``order_ids`` that ``owner`` sells.
+
+    Returns ``{order_id: 'ok' | reason}``. Ownership is checked with one
+    query, the change is one UPDATE, and the rollup and customer
+    notifications are written in one statement each.
+    """
+    if new_status not in STATUSES:
+        raise ValueError(new_status)
+    order_ids = list(dict.fromkeys(order_ids))
+    results = {}
+    with transaction.atomic():
+        orders = (
+            Order.objects.filter(pk__in=order_ids, shop__owner=owner)
+            .select_related('shop')
+            .only('id', 'status', 'total', 'created_at', 'customer_id', 'shop__name')
+            .select_for_update()
+            .in_bulk()
+        )
+        changed = []
+        for order_id in order_ids:
+            order = orders.get(order_id)
+            if order is None:
+                results[order_id] = 'introuvable'
+            elif order.status == new_status:
+                results[order_id] = 'inchangée'
+            else:
+                results[order_id] = 'ok'
+                changed.append(order)
+        if not changed:
+            return results
+
+        Order.objects.filter(pk__in=[order.pk for order in changed], shop__owner=owner).update(status=new_status)
+        record_status_changes(changed, new_status)
+        orders_changed()
+        queue([
+            notif for notif in (status_notification(order, order.shop.name, new_status) for order in changed)
+            if notif is not None
+        ])
+    return results
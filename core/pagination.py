@@ -0,0 +1,90 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+PER_PAGE = 20
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+def _fields(queryset, ordering):
+    opts = queryset.model._meta
+    return [(name.lstrip('-'), name.startswith('-'), opts.get_field(name.lstrip('-'))) for name in ordering]
+
+
+def encode_cursor(obj, ordering):
+    values = [getattr(obj, name.lstrip('-')) for name in ordering]
+    raw = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else str(value) for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(queryset, ordering, cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        fields = _fields(queryset, ordering)
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise InvalidCursor(cursor)
+        return [field.to_python(value) for (_, _, field), value in zip(fields, values)]
+    except (ValueError, TypeError, ValidationError) as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+def _after(queryset, ordering, cursor):
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = decode_cursor(queryset, ordering, cursor)
+        after = Q()
+        equal = {}
+        for (name, descending, _), value in zip(_fields(queryset, ordering), values):
+            lookup = 'lt' if descending else 'gt'
+            after |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        queryset = queryset.filter(after)
+    return queryset
+
+
+def _page(items, ordering, per_page):
+    next_cursor = encode_cursor(items[per_page - 1], ordering) if len(items) > per_page else None
+    return KeysetPage(items[:per_page], next_cursor)
+
+
+def keyset_paginate(queryset, ordering=('-created_at', '-id'), cursor=None, per_page=PER_PAGE):
+    """Return the page of ``queryset`` that follows ``cursor``.
+
+    Rows are compared on the ``ordering`` columns (which must end with a
+    unique one, usually ``id``), so any page costs the same index seek
+    instead of an ``OFFSET`` that grows with the page number.
+    Raises ``InvalidCursor`` for a cursor this ordering did not produce.
+    """
+    items = list(_after(queryset, ordering, cursor)[:per_page + 1])
+    return _page(items, ordering, per_page)
+
+
+async def akeyset_paginate(queryset, ordering=('-created_at', '-id'), cursor=None, per_page=PER_PAGE):
+    """``keyset_paginate`` for async views."""
+    items = [obj async for obj in _after(queryset, ordering, cursor)[:per_page + 1]]
+    return _page(items, ordering, per_page)
@@ -0,0 +1,188 @@
+import codecs
+import csv
+import json
+import os
+
+from django.conf import settings
+from django.db import transaction
+
+from . import counters
+from .caching import catalogue_changed
+from .forms import ProductRowForm
+from .models import Category, Product
+
+FORMATS = ('csv', 'jsonl')
+PRODUCT_COLUMNS = ['name', 'description', 'price', 'stock', 'category']
+MAX_REPORTED_ERRORS = 50
+
+
+class ImportReport:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def _batch_size():
+    return getattr(settings, 'PRODUCT_IMPORT_BATCH_SIZE', 500)
+
+
+def detect_format(filename):
+    ext = os.path.splitext(filename)[1].lower().lstrip('.')
+    return 'jsonl' if ext in ('jsonl', 'ndjson', 'json') else 'csv'
+
+
+def _undecodable_line(stream, chunk_size=64 * 1024):
+    """Return the number of the first line of ``stream`` that is not UTF-8, or ``None``.
+
+    The file is scanned in chunks, then rewound for ``read_rows``.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    line = 1
+    try:
+        for chunk in iter(lambda: stream.read(chunk_size), b''):
+            try:
+                decoder.decode(chunk)
+            except UnicodeDecodeError as exc:
+                return line + chunk[:max(exc.start, 0)].count(b'\n')
+            line += chunk.count(b'\n')
+        try:
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            return line
+        return None
+    finally:
+        stream.seek(0)
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line_number, row_dict)`` from a binary file, one line at a time."""
+    text = codecs.iterdecode(stream, 'utf-8-sig')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, None
+            continue
+        yield number, row if isinstance(row, dict) else None
+
+
+def _write_batch(shop, batch, categories, report):
+    """Create or update one batch of cleaned rows in a handful of queries."""
+    missing = {row['category'].casefold(): row['category'] for _, row in batch
+               if row['category'] and row['category'].casefold() not in categories}
+    if missing:
+        created = Category.objects.bulk_create([Category(shop=shop, name=name) for name in missing.values()])
+        categories.update({category.name.casefold(): category for category in created})
+
+    existing = {}
+    for product in shop.products.filter(name__in=[row['name'] for _, row in batch]).order_by('-pk'):
+        existing[product.name] = product
+    new, changed = {}, {}
+    for _, row in batch:
+        category = categories.get(row['category'].casefold()) if row['category'] else None
+        product = existing.get(row['name']) or new.get(row['name'])
+        if product is None:
+            new[row['name']] = Product(
+                shop=shop, name=row['name'], category=category,
+                description=row['description'], price=row['price'], stock=row['stock'],
+            )
+            continue
+        product.description, product.price, product.stock = row['description'], row['price'], row['stock']
+        product.category = category
+        if product.pk:
+            changed[product.pk] = product
+
+    Product.objects.bulk_create(new.values())
+    Product.objects.bulk_update(changed.values(), ['category', 'description', 'price', 'stock'])
+    counters.add({'products': len(new)})
+    catalogue_changed([shop.pk], [product.pk for product in [*new.values(), *changed.values()]])
+    report.created += len(new)
+    report.updated += len(changed)
+
+
+def import_products(shop, stream, fmt='csv', batch_size=None):
+    """Create or update ``shop``'s products from a CSV or JSONL file and return an ``ImportReport``.
+
+    The file is read line by line and written in batches of ``batch_size``
+    rows, each in its own transaction, so memory use does not grow with
+    the file. Rows are validated with the ``ProductForm`` rules; a product
+    whose name already exists in the shop is updated, and unknown
+    categories are created.
+
+    ``stream`` must be seekable: it is checked to be UTF-8 before anything
+    is written, so a file saved in another encoding (such as Excel's
+    Windows-1252 CSV) is rejected as a whole.
+    """
+    batch_size = batch_size or _batch_size()
+    report = ImportReport()
+    bad_line = _undecodable_line(stream)
+    if bad_line is not None:
+        report.error(bad_line, "Le fichier n'est pas encodé en UTF-8, aucun produit n'a été importé. "
+                               "Enregistrez-le au format « CSV UTF-8 » puis réessayez.")
+        return report
+    categories = {category.name.casefold(): category for category in shop.categories.all()}
+    batch = []
+
+    def flush():
+        with transaction.atomic():
+            _write_batch(shop, batch, categories, report)
+        batch.clear()
+
+    for line, row in read_rows(stream, fmt):
+        if row is None:
+            report.error(line, 'Ligne illisible.')
+            continue
+        form = ProductRowForm({key: row.get(key) for key in PRODUCT_COLUMNS})
+        if not form.is_valid():
+            report.error(line, ' ; '.join(
+                f'{field} : {error}' for field, errors in form.errors.items() for error in errors
+            ))
+            continue
+        batch.append((line, form.cleaned_data))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return report
+
+
+class _Echo:
+    """File-like object whose ``write`` hands the line back, for ``csv.writer``."""
+    def write(self, value):
+        return value
+
+
+def lines(columns, rows, fmt):
+    """Encode ``rows`` lazily as CSV (with a header) or JSONL lines."""
+    if fmt == 'jsonl':
+        for row in rows:
+            yield json.dumps(dict(zip(columns, row)), default=str, ensure_ascii=False) + '\n'
+        return
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def export_products(shop, fmt='csv', chunk_size=2000):
+    """Yield ``shop``'s catalogue as CSV or JSONL lines, in the import format."""
+    rows = (
+        shop.products.order_by('pk')
+        .values_list('name', 'description', 'price', 'stock', 'category__name')
+        .iterator(chunk_size=chunk_size)
+    )
+    return lines(PRODUCT_COLUMNS, ((*row[:4], row[4] or '') for row in rows), fmt)
@@ -0,0 +1,76 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.utils import timezone
+
+from .models import OrderItem
+from .product_io import lines
+
+LINE_COLUMNS = [
+    'order', 'created_at', 'status', 'customer', 'product', 'quantity', 'price', 'line_total', 'order_total',
+]
+PRODUCT_COLUMNS = ['product_id', 'product', 'orders', 'quantity_ordered', 'quantity_delivered', 'revenue']
+CENT = Decimal('0.01')
+
+
+def _cents(rows, column):
+    # Computed decimals come back from SQLite unrounded.
+    for row in rows:
+        yield (*row[:column], Decimal(row[column]).quantize(CENT), *row[column + 1:])
+
+
+def _items(shop, start=None, end=None):
+    """Items of ``shop``'s orders placed between the ``start`` and ``end`` dates, inclusive."""
+    items = OrderItem.objects.filter(order__shop=shop)
+    tz = timezone.get_current_timezone()
+    if start:
+        items = items.filter(order__created_at__gte=datetime.combine(start, time.min, tz))
+    if end:
+        items = items.filter(order__created_at__lt=datetime.combine(end + timedelta(days=1), time.min, tz))
+    return items
+
+
+def order_lines(shop, start=None, end=None, chunk_size=2000):
+    """Yield one tuple per order item, oldest order first, without building model instances."""
+    return (
+        _items(shop, start, end).order_by('order_id', 'pk')
+        .values_list(
+            'order_id', 'order__created_at', 'order__status', 'order__customer__username',
+            'product__name', 'quantity', 'price', F('quantity') * F('price'), 'order__total',
+        )
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def product_totals(shop, start=None, end=None):
+    """Per-product figures for the period, aggregated by the database.
+
+    Cancelled orders are left out of the quantities; like the dashboard,
+    revenue only counts delivered orders.
+    """
+    live = ~Q(order__status='cancelled')
+    delivered = Q(order__status='delivered')
+    return (
+        _items(shop, start, end)
+        .values('product_id', 'product__name')
+        .annotate(
+            orders=Count('order', distinct=True, filter=live),
+            quantity_ordered=Sum('quantity', filter=live, default=0),
+            quantity_delivered=Sum('quantity', filter=delivered, default=0),
+            revenue=Sum(F('quantity') * F('price'), filter=delivered, default=0,
+                        output_field=DecimalField(max_digits=12, decimal_places=2)),
+        )
+        .order_by('-revenue', 'product__name')
+    )
+
+
+def export_order_lines(shop, fmt='csv', start=None, end=None):
+    return lines(LINE_COLUMNS, _cents(order_lines(shop, start, end), 7), fmt)
+
+
+def export_product_totals(shop, fmt='csv', start=None, end=None):
+    rows = product_totals(shop, start, end).values_list(
+        'product_id', 'product__name', 'orders', 'quantity_ordered', 'quantity_delivered', 'revenue',
+    )
+    return lines(PRODUCT_COLUMNS, _cents(rows.iterator(), 5), fmt)
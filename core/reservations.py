@@ -0,0 +1,101 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Least
+from django.utils import timezone
+
+from .models import Product, StockReservation
+
+
+class ReservationError(Exception):
+    def __init__(self, product, available):
+        self.product = product
+        self.available = max(available, 0)
+        super().__init__(
+            f'Plus que {self.available} « {product.name} » disponible(s), '
+            'le reste est réservé dans d\'autres paniers.'
+        )
+
+
+def _hold_duration():
+    return timedelta(minutes=getattr(settings, 'STOCK_HOLD_MINUTES', 15))
+
+
+def _expiry(now):
+    # Extensions never push a hold past its maximum lifetime.
+    max_lifetime = timedelta(minutes=getattr(settings, 'STOCK_HOLD_MAX_MINUTES', 60))
+    return Least(Value(now + _hold_duration()), F('created_at') + max_lifetime)
+
+
+def active(now=None):
+    return StockReservation.objects.filter(expires_at__gt=now or timezone.now())
+
+
+def held(product_ids):
+    """Return ``{product_id: quantity}`` held by active reservations.
+
+    One grouped query, answered from ``reservation_product_active_idx``.
+    """
+    return dict(
+        active().filter(product__in=product_ids).order_by()
+        .values('product').annotate(n=Sum('quantity')).values_list('product', 'n')
+    )
+
+
+def hold(holder, product, quantity):
+    """Hold ``quantity`` of ``product`` for the cart ``holder``, replacing its previous hold.
+
+    The hold is written before availability is checked, so on SQLite the
+    transaction owns the write lock by the time it counts and two carts
+    cannot both take the last unit. Raises ``ReservationError`` (and keeps
+    the previous hold) when other carts leave too little stock.
+    """
+    now = timezone.now()
+    others = Subquery(
+        active().filter(product=OuterRef('pk')).exclude(holder=holder)
+        .order_by().values('product').annotate(n=Sum('quantity')).values('n'),
+        output_field=IntegerField(),
+    )
+    with transaction.atomic():
+        StockReservation.objects.bulk_create(
+            [StockReservation(holder=holder, product=product, quantity=quantity, expires_at=now + _hold_duration())],
+            update_conflicts=True, unique_fields=['holder', 'product'], update_fields=['quantity'],
+        )
+        # An existing hold keeps its created_at, which caps the new expiry.
+        StockReservation.objects.filter(holder=holder, product=product).update(expires_at=_expiry(now))
+        stock, held_by_others = (
+            Product.objects.filter(pk=product.pk)
+            .annotate(others=Coalesce(others, Value(0)))
+            .values_list('stock', 'others').get()
+        )
+        if stock - held_by_others < quantity:
+            raise ReservationError(product, stock - held_by_others)
+
+
+def extend(holder):
+    """Push back the expiry of every active hold of ``holder``, up to its maximum lifetime."""
+    now = timezone.now()
+    return active(now).filter(holder=holder).update(expires_at=_expiry(now))
+
+
+def release(holder, product_ids=None):
+    holds = StockReservation.objects.filter(holder=holder)
+    if product_ids is not None:
+        holds = holds.filter(product__in=product_ids)
+    return holds.delete()[0]
+
+
+def release_expired(batch_size=1000):
+    """Delete expired holds in batches and return how many went."""
+    now = timezone.now()
+    released = 0
+    while True:
+        ids = list(
+            StockReservation.objects.filter(expires_at__lte=now)
+            .order_by('expires_at').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return released
+        released += StockReservation.objects.filter(pk__in=ids).delete()[0]
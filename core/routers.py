@@ -0,0 +1,101 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Apps whose rows are read back right after being written by the same
+# user (session, cart, flash messages): always on the primary.
+PRIMARY_APPS = {'sessions'}
+
+
+class _Reads:
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+        # Transactions opened inside the block pin reads to the primary.
+        self.depth = len(connections[DEFAULT_DB_ALIAS].atomic_blocks)
+
+
+_reads = ContextVar('replica_reads', default=None)
+
+
+def replica_alias():
+    return getattr(settings, 'REPLICA_DATABASE', None)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Let reads in the block go to the replica, until the first write.
+
+    Code outside such a block (management commands, workers) always reads
+    the primary. Yields the state, whose ``wrote`` flag tells whether the
+    block wrote anything.
+    """
+    state = _Reads(enabled and bool(replica_alias()))
+    token = _reads.set(state)
+    try:
+        yield state
+    finally:
+        _reads.reset(token)
+
+
+@contextmanager
+def resume_reads(state):
+    """Route the block's reads by ``state``, a state yielded by ``replica_reads``."""
+    token = _reads.set(state)
+    try:
+        yield state
+    finally:
+        _reads.reset(token)
+
+
+def primary_reads(view):
+    """Read the primary for the whole view, e.g. one that reads then writes a cart."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        # The middleware's state is switched rather than replaced, so a
+        # write in the view still sets the read-your-writes cookie.
+        state = _reads.get()
+        if state is not None:
+            state.replica = False
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def reading_replica():
+    """Whether reads currently go to the replica."""
+    state = _reads.get()
+    return bool(
+        state and state.replica
+        and len(connections[DEFAULT_DB_ALIAS].atomic_blocks) <= state.depth
+    )
+
+
+class ReplicaRouter:
+    """Send reads to ``settings.REPLICA_DATABASE`` inside ``replica_reads()``.
+
+    Writes always go to the primary and pin the rest of the block to it, as
+    do open transactions, so a view never reads back stale rows it has
+    just written.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label not in PRIMARY_APPS and reading_replica():
+            return replica_alias()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _reads.get()
+        if state is not None:
+            state.replica = False
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica is a copy of the primary, refreshed by sync_replica.
+        return db == DEFAULT_DB_ALIAS
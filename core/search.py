@@ -0,0 +1,100 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Product
+
+PER_PAGE = 20
+MAX_PAGE = 50
+
+# bm25 weights for the name, description and category columns.
+RANKING = 'bm25(core_product_fts, 10.0, 1.0, 4.0)'
+
+REBUILD_SQL = [
+    'DELETE FROM core_product_fts',
+    """
+    INSERT INTO core_product_fts(rowid, name, description, category)
+    SELECT p.id, p.name, p.description, COALESCE(c.name, '')
+    FROM core_product p LEFT JOIN core_category c ON c.id = p.category_id
+    """,
+]
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query matching every word as a prefix."""
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def _filters(shop=None, category=None, min_price=None, max_price=None, in_stock=True):
+    filters = Q()
+    if shop is not None:
+        filters &= Q(shop_id=shop)
+    if category is not None:
+        filters &= Q(category_id=category)
+    if min_price is not None:
+        filters &= Q(price__gte=min_price)
+    if max_price is not None:
+        filters &= Q(price__lte=max_price)
+    if in_stock:
+        filters &= Q(stock__gt=0)
+    return filters
+
+
+def _ranked_ids(query, filters, limit, offset):
+    # The filters only touch core_product columns, so the ORM can compile
+    # them into a WHERE clause for the raw FTS join.
+    where, params = '', [query]
+    if filters:
+        orm_query = Product.objects.filter(filters).query
+        compiler = orm_query.get_compiler(connection=connection)
+        sql, filter_params = orm_query.where.as_sql(compiler, connection)
+        where = f' AND {sql}'
+        params += list(filter_params)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT core_product.id FROM core_product_fts '
+            'JOIN core_product ON core_product.id = core_product_fts.rowid '
+            f'WHERE core_product_fts MATCH %s{where} '
+            f'ORDER BY {RANKING}, core_product.id LIMIT %s OFFSET %s',
+            params + [limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_products(text, page=1, per_page=PER_PAGE, **filters):
+    """Return ``(products, has_next)`` for one page of ranked search results.
+
+    On SQLite the ranking comes from the ``core_product_fts`` index; other
+    databases fall back to ``icontains`` matching, newest first.
+    Accepted filters: ``shop``, ``category``, ``min_price``, ``max_price``
+    and ``in_stock``.
+    """
+    page = max(1, min(page, MAX_PAGE))
+    offset = (page - 1) * per_page
+    query = fts_query(text)
+    if not query:
+        return [], False
+    conditions = _filters(**filters)
+    if connection.vendor == 'sqlite':
+        ids = _ranked_ids(query, conditions, per_page + 1, offset)
+        products = Product.objects.select_related('shop', 'category').in_bulk(ids[:per_page])
+        results = [products[pk] for pk in ids[:per_page] if pk in products]
+        return results, len(ids) > per_page
+
+    for word in re.findall(r'\w+', text):
+        conditions &= Q(name__icontains=word) | Q(description__icontains=word) | Q(category__name__icontains=word)
+    results = list(
+        Product.objects.filter(conditions).select_related('shop', 'category')
+        .order_by('-created_at', '-id')[offset:offset + per_page + 1]
+    )
+    return results[:per_page], len(results) > per_page
+
+
+def rebuild_index():
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for sql in REBUILD_SQL:
+            cursor.execute(sql)
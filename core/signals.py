@@ -0,0 +1,104 @@
+from copy import copy
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import counters, images, stats
+from .caching import catalogue_changed, orders_changed, shop_products_changed
+from .models import Category, Order, Product, Shop
+
+
+def _count(signal, created):
+    if signal is post_delete:
+        return -1
+    return 1 if created else 0
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, signal, created=False, **kwargs):
+    counters.add({'products': _count(signal, created)})
+    catalogue_changed([instance.shop_id], [instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Shop)
+def shop_changed(sender, instance, signal, created=False, **kwargs):
+    counters.add({'shops': _count(signal, created)})
+    shop_products_changed(instance.pk)
+    if signal is post_save and not created:
+        # Orders keep a copy of the owner as their seller: a transferred
+        # shop hands its orders over to the new owner.
+        moved = Order.objects.filter(shop=instance).exclude(seller_id=instance.owner_id)
+        if moved.update(seller_id=instance.owner_id):
+            orders_changed()
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=Shop)
+def image_uploaded(sender, instance, **kwargs):
+    # A file not yet written to storage is a new upload, from a view, the
+    # admin or the shell: its derivatives are (re)made after the commit.
+    field = dict(images.IMAGE_FIELDS)[sender]
+    fieldfile = getattr(instance, field)
+    instance._image_uploaded = bool(fieldfile) and not fieldfile._committed
+    if instance._image_uploaded:
+        setattr(instance, f'{field}_status', 'pending')
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Shop)
+def process_uploaded_image(sender, instance, **kwargs):
+    if getattr(instance, '_image_uploaded', False):
+        fieldfile = getattr(instance, dict(images.IMAGE_FIELDS)[sender])
+        transaction.on_commit(lambda: images.process(fieldfile))
+
+
+@receiver([post_save, pre_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    # Only the category's products show its name. On deletion they are
+    # collected before SET_NULL detaches them, hence pre_delete.
+    catalogue_changed([instance.shop_id], list(instance.products.values_list('pk', flat=True)))
+
+
+@receiver(post_init, sender=Order)
+def order_loaded(sender, instance, **kwargs):
+    # Remember the status the order was read or bulk-created with, so a save
+    # that changes it can move the order in the rollup without a query.
+    if 'status' not in instance.get_deferred_fields():
+        instance._saved_status = instance.status
+
+
+@receiver([post_save, post_delete], sender=Order)
+def order_changed(sender, instance, signal, created=False, update_fields=None, **kwargs):
+    # Saves that change the status (views, admin, shell) update the rollup
+    # and the delivered counter here; queryset updates such as
+    # ``orders.bulk_update_status`` call ``record_status_changes`` themselves.
+    if signal is post_save and (update_fields is None or 'status' in update_fields):
+        saved_status = getattr(instance, '_saved_status', None)
+        if not created and saved_status not in (None, instance.status):
+            before = copy(instance)
+            before.status = saved_status
+            stats.record_status_changes([before], instance.status)
+        instance._saved_status = instance.status
+    if signal is post_delete and instance.status == 'delivered':
+        counters.add({'delivered_orders': -1})
+    orders_changed()
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, signal, created=False, **kwargs):
+    counters.add({'users': _count(signal, created)})
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """Apply ``settings.SQLITE_PRAGMAS`` to every new SQLite connection."""
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,117 @@
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import counters
+from .models import Order, OrderItem, ShopDailyStats
+
+STATUSES = [status for status, _ in Order.STATUS_CHOICES]
+
+
+def _apply_deltas(deltas):
+    """Add ``deltas[(shop_id, day)][column]`` to the matching rollup rows in one UPDATE."""
+    if not deltas:
+        return
+    match = Q()
+    for shop_id, day in deltas:
+        match |= Q(shop_id=shop_id, day=day)
+    columns = {column for row in deltas.values() for column in row}
+    updates = {}
+    for column in columns:
+        output_field = DecimalField() if column == 'revenue' else IntegerField()
+        updates[column] = F(column) + Case(
+            *[
+                When(shop_id=shop_id, day=day, then=Value(row[column], output_field=output_field))
+                for (shop_id, day), row in deltas.items() if column in row
+            ],
+            default=Value(0, output_field=output_field), output_field=output_field,
+        )
+    ShopDailyStats.objects.filter(match).update(**updates)
+
+
+def record_new_orders(orders, items):
+    """Add freshly placed ``orders`` (and their ``items``) to today's rollup.
+
+    Two queries regardless of how many shops the orders span: one insert
+    that creates missing rows and one UPDATE that increments them all.
+    """
+    if not orders:
+        return
+    day = timezone.localdate()
+    deltas = {}
+    for order in orders:
+        row = deltas.setdefault((order.shop_id, day), {'orders': 0, 'pending': 0, 'units_sold': 0})
+        row['orders'] += 1
+        row['pending'] += 1
+    for item in items:
+        deltas[(item.order.shop_id, day)]['units_sold'] += item.quantity
+
+    ShopDailyStats.objects.bulk_create(
+        [ShopDailyStats(shop_id=shop_id, day=day) for shop_id, day in deltas],
+        ignore_conflicts=True,
+    )
+    _apply_deltas(deltas)
+
+
+def record_status_changes(orders, new_status):
+    """Move every order in ``orders`` from its current ``status`` to ``new_status``.
+
+    ``orders`` must still carry the status they had before the change; the
+    whole batch is applied to the rollup with a single UPDATE, and the
+    site-wide delivered counter follows.
+    """
+    deltas, delivered = {}, 0
+    for order in orders:
+        if order.status == new_status:
+            continue
+        delivered += (new_status == 'delivered') - (order.status == 'delivered')
+        row = deltas.setdefault((order.shop_id, timezone.localdate(order.created_at)), {})
+        row[order.status] = row.get(order.status, 0) - 1
+        row[new_status] = row.get(new_status, 0) + 1
+        if 'delivered' in (order.status, new_status):
+            sign = 1 if new_status == 'delivered' else -1
+            row['revenue'] = row.get('revenue', 0) + sign * order.total
+    _apply_deltas(deltas)
+    counters.add({'delivered_orders': delivered})
+
+
+def rebuild(shops=None, batch_size=1000):
+    """Recompute rollup rows from ``Order`` history and return how many were written."""
+    orders = Order.objects.all()
+    items = OrderItem.objects.all()
+    stats = ShopDailyStats.objects.all()
+    if shops is not None:
+        orders = orders.filter(shop__in=shops)
+        items = items.filter(order__shop__in=shops)
+        stats = stats.filter(shop__in=shops)
+
+    day = TruncDate('created_at', tzinfo=timezone.get_current_timezone())
+    rows = (
+        orders.order_by()
+        .annotate(day=day)
+        .values('shop_id', 'day')
+        .annotate(
+            orders=Count('id'),
+            revenue=Sum('total', filter=Q(status='delivered'), default=0),
+            **{status: Count('id', filter=Q(status=status)) for status in STATUSES},
+        )
+    )
+    units = {
+        (row['order__shop_id'], row['day']): row['units']
+        for row in (
+            items.order_by()
+            .annotate(day=TruncDate('order__created_at', tzinfo=timezone.get_current_timezone()))
+            .values('order__shop_id', 'day')
+            .annotate(units=Sum('quantity'))
+        )
+    }
+
+    objs = [
+        ShopDailyStats(units_sold=units.get((row['shop_id'], row['day']), 0), **row)
+        for row in rows.iterator()
+    ]
+    with transaction.atomic():
+        stats.delete()
+        ShopDailyStats.objects.bulk_create(objs, batch_size=batch_size)
+    return len(objs)
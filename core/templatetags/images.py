@@ -0,0 +1,21 @@
+from django import template
+
+from ..images import derivative_url
+
+register = template.Library()
+
+
+@register.filter
+def derivative(fieldfile, size):
+    """``{{ product.image|derivative:'thumb' }}``: JPEG URL of a derivative."""
+    return derivative_url(fieldfile, size)
+
+
+@register.inclusion_tag('core/partials/picture.html')
+def picture(fieldfile, size, alt=''):
+    """``{% picture product.image 'card' product.name %}``: WebP with a JPEG fallback."""
+    return {
+        'webp': derivative_url(fieldfile, size, 'webp'),
+        'jpg': derivative_url(fieldfile, size, 'jpg'),
+        'alt': alt,
+    }
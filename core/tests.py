@@ -1,3 +1,1464 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.contrib.sessions.models import Session
+from django.db import connection, router, transaction, OperationalError
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.db.models import Sum
+from django.http import HttpResponse
+from asgiref.sync import sync_to_async
+from django.test import AsyncClient, Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.shortcuts import render
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .cache_backends import SessionFileCache
+from .caching import REPLICA, bump, product_scope, with_versions
+from .cart import Cart
+from .checkout import place_orders, CheckoutError
+from .counters import totals
+from .product_io import import_products
+from .images import DERIVATIVES_DIR, PLACEHOLDER, derivative_name, derivative_url, process_pending, requeue
+from .context_processors import notifications_ctx
+from .models import (
+    last_months, Shop, Category, Product, Order, OrderItem, Notification, NotificationOutbox, ShopDailyStats,
+    SiteCounter, StockReservation,
+)
+from .middleware import STICKY_COOKIE, replica_middleware
+from .notifications import queue, unread_count
+from .routers import ReplicaRouter, replica_reads
+from .orders import bulk_update_status
+from .pagination import encode_cursor
+from .search import search_products
+
+
+def make_catalogue(shop_count=2, products_per_shop=3, stock=10, seller='seller'):
+    seller = User.objects.create_user(seller)
+    products = []
+    for s in range(shop_count):
+        shop = Shop.objects.create(owner=seller, name=f'Boutique {s}')
+        for p in range(products_per_shop):
+            products.append(Product.objects.create(
+                shop=shop, name=f'Produit {s}-{p}', description='…',
+                price=Decimal('10.00') + p, stock=stock,
+            ))
+    return seller, products
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.seller, self.products = make_catalogue()
+        self.buyer = User.objects.create_user('buyer')
+
+    def test_creates_one_order_per_shop(self):
+        cart = {str(p.pk): 2 for p in self.products}
+        orders = place_orders(self.buyer, cart)
+        self.assertEqual(len(orders), 2)
+        self.assertEqual(OrderItem.objects.count(), len(self.products))
+        self.assertEqual(Notification.objects.filter(recipient=self.seller, notif_type='new_order').count(), 2)
+        for order in Order.objects.all():
+            expected = sum(item.get_subtotal() for item in order.items.all())
+            self.assertEqual(order.total, expected)
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {8})
+
+    def test_query_count_does_not_grow_with_cart(self):
+        small = {str(self.products[0].pk): 1}
+        with self.assertNumQueries(10):
+            place_orders(self.buyer, small)
+        _, more = make_catalogue(shop_count=5, products_per_shop=6, seller='seller2')
+        big = {str(p.pk): 1 for p in more}
+        with self.assertNumQueries(10):
+            place_orders(self.buyer, big)
+
+    def test_rejects_own_products(self):
+        with self.assertRaises(CheckoutError):
+            place_orders(self.seller, {str(self.products[0].pk): 1})
+        self.assertFalse(Order.objects.exists())
+
+    def test_insufficient_stock_rolls_back(self):
+        cart = {str(self.products[0].pk): 1, str(self.products[1].pk): 11}
+        with self.assertRaises(CheckoutError):
+            place_orders(self.buyer, cart)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock, 10)
+
+    def test_view_empties_cart(self):
+        self.client.force_login(self.buyer)
+        session = self.client.session
+        session['cart'] = {str(self.products[0].pk): 1}
+        session.save()
+        response = self.client.post(reverse('checkout'))
+        self.assertRedirects(response, reverse('my_orders'))
+        self.assertEqual(self.client.session['cart'], {})
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.seller, self.products = make_catalogue(shop_count=1, products_per_shop=1, stock=2)
+        self.product = self.products[0]
+        self.buyer = User.objects.create_user('buyer')
+
+    def add(self, client, times=1):
+        for _ in range(times):
+            response = client.post(reverse('add_to_cart', args=[self.product.pk]))
+        return response
+
+    def test_holds_limit_other_carts(self):
+        first, second = Client(), Client()
+        self.add(first, 2)
+        response = self.add(second)
+        self.assertRedirects(response, reverse('product_detail', args=[self.product.pk]), fetch_redirect_response=False)
+        self.assertFalse(Cart(second.session))
+        self.assertEqual(StockReservation.objects.get().quantity, 2)
+
+        first.post(reverse('remove_from_cart', args=[self.product.pk]))
+        self.assertFalse(StockReservation.objects.exists())
+        self.add(second)
+        self.assertEqual(Cart(second.session).quantities, {str(self.product.pk): 1})
+
+    def test_expired_holds_are_released(self):
+        self.add(Client(), 2)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        other = Client()
+        self.add(other)
+        self.assertEqual(Cart(other.session).quantities, {str(self.product.pk): 1})
+        out = StringIO()
+        call_command('release_holds', stdout=out)
+        self.assertIn('1 réservation(s)', out.getvalue())
+        self.assertEqual(StockReservation.objects.get().quantity, 1)
+
+    def test_links_do_not_hold_stock(self):
+        response = Client().get(reverse('add_to_cart', args=[self.product.pk]))
+        self.assertRedirects(response, reverse('product_detail', args=[self.product.pk]), fetch_redirect_response=False)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_cached_shop_page_forms_post_with_cookie_token(self):
+        cache.clear()
+        shop_url = reverse('shop_detail', args=[self.product.shop_id])
+        Client().get(shop_url)
+        client = Client(enforce_csrf_checks=True)
+        response = client.get(shop_url)
+        self.assertContains(response, 'data-csrf')
+        self.assertNotContains(response, 'type="hidden" name="csrfmiddlewaretoken"')
+        token = client.cookies[settings.CSRF_COOKIE_NAME].value
+        response = client.post(reverse('add_to_cart', args=[self.product.pk]), {'csrfmiddlewaretoken': token})
+        self.assertRedirects(response, reverse('cart_detail'), fetch_redirect_response=False)
+        self.assertEqual(StockReservation.objects.get().quantity, 1)
+
+    @override_settings(STOCK_HOLD_MINUTES=15, STOCK_HOLD_MAX_MINUTES=20)
+    def test_holds_have_a_maximum_lifetime(self):
+        client = Client()
+        self.add(client)
+        StockReservation.objects.update(created_at=timezone.now() - timedelta(minutes=10))
+        client.get(reverse('cart_detail'))
+        hold = StockReservation.objects.get()
+        self.assertAlmostEqual(hold.expires_at, hold.created_at + timedelta(minutes=20), delta=timedelta(seconds=1))
+        self.add(client)
+        self.assertEqual(StockReservation.objects.get().expires_at, hold.expires_at)
+
+    def test_checkout_turns_holds_into_sales(self):
+        client = Client()
+        client.force_login(self.buyer)
+        self.add(client)
+        other = User.objects.create_user('other')
+        with self.assertRaises(CheckoutError):
+            place_orders(other, {str(self.product.pk): 2})
+        client.post(reverse('checkout'))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+        self.assertFalse(StockReservation.objects.exists())
+        place_orders(other, {str(self.product.pk): 1})
+
+
+class ShopDailyStatsTests(TestCase):
+    fields = ['orders', 'pending', 'processing', 'shipped', 'delivered', 'cancelled', 'revenue', 'units_sold']
+
+    def setUp(self):
+        self.seller, self.products = make_catalogue()
+        self.buyer = User.objects.create_user('buyer')
+
+    def snapshot(self):
+        return sorted(ShopDailyStats.objects.values_list('shop_id', 'day', *self.fields))
+
+    def set_status(self, order, status):
+        self.client.force_login(self.seller)
+        self.client.post(reverse('update_order_status', args=[order.pk]), {'status': status})
+
+    def test_checkout_and_status_changes_update_rollup(self):
+        orders = place_orders(self.buyer, {str(p.pk): 3 for p in self.products})
+        self.assertEqual(ShopDailyStats.objects.count(), 2)
+        self.assertEqual(ShopDailyStats.objects.aggregate(n=Sum('units_sold'))['n'], 3 * len(self.products))
+        self.set_status(orders[0], 'delivered')
+        self.set_status(orders[1], 'cancelled')
+        row = ShopDailyStats.objects.get(shop=orders[0].shop)
+        self.assertEqual((row.orders, row.pending, row.delivered), (1, 0, 1))
+        self.assertEqual(row.revenue, orders[0].total)
+        self.set_status(orders[0], 'processing')
+        row.refresh_from_db()
+        self.assertEqual((row.delivered, row.processing, row.revenue), (0, 1, 0))
+
+    def test_status_is_read_inside_the_transaction(self):
+        order = place_orders(self.buyer, {str(self.products[0].pk): 1})[0]
+        atomic, raced = transaction.atomic, []
+
+        def atomic_after_concurrent_change(*args, **kwargs):
+            if not raced:
+                # Another request delivers the order just before this one starts its transaction.
+                raced.append(True)
+                bulk_update_status(self.seller, [order.pk], 'delivered')
+            return atomic(*args, **kwargs)
+
+        self.client.force_login(self.seller)
+        with mock.patch.object(transaction, 'atomic', atomic_after_concurrent_change):
+            self.client.post(reverse('update_order_status', args=[order.pk]), {'status': 'cancelled'})
+        row = ShopDailyStats.objects.get(shop=order.shop)
+        self.assertEqual((row.pending, row.delivered, row.cancelled), (0, 0, 1))
+        self.assertEqual(totals()['delivered_orders'], 0)
+
+    def test_saving_a_new_status_updates_rollup_and_counter(self):
+        # As the order admin does.
+        order = place_orders(self.buyer, {str(self.products[0].pk): 2})[0]
+        order.status = 'delivered'
+        order.save()
+        order.save()
+        row = ShopDailyStats.objects.get(shop=order.shop)
+        self.assertEqual((row.pending, row.delivered, row.revenue), (0, 1, order.total))
+        self.assertEqual(totals()['delivered_orders'], 1)
+        Order.objects.get(pk=order.pk).save(update_fields=['total'])
+        self.assertEqual(totals()['delivered_orders'], 1)
+
+    def test_rebuild_matches_incremental_updates(self):
+        orders = place_orders(self.buyer, {str(p.pk): 1 for p in self.products})
+        place_orders(self.buyer, {str(self.products[0].pk): 2})
+        self.set_status(orders[0], 'delivered')
+        incremental = self.snapshot()
+        ShopDailyStats.objects.all().delete()
+        call_command('rebuild_shop_stats', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_dashboard_reads_rollup(self):
+        place_orders(self.buyer, {str(p.pk): 1 for p in self.products})
+        self.client.force_login(self.seller)
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['total_orders'], 2)
+        self.assertEqual(response.context['pending_orders'], 2)
+        self.assertEqual(sum(json.loads(response.context['chart_data'])), 2)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    def test_stock_never_goes_negative(self):
+        seller, products = make_catalogue(shop_count=1, products_per_shop=1, stock=5)
+        product = products[0]
+        buyers = [User.objects.create_user(f'buyer{i}') for i in range(12)]
+        results = []
+        barrier = threading.Barrier(len(buyers))
+
+        def buy(user):
+            barrier.wait()
+            try:
+                # The shared in-memory test database rejects concurrent
+                # writers outright instead of waiting, so retry like a
+                # buyer clicking again would.
+                for _ in range(200):
+                    try:
+                        place_orders(user, {str(product.pk): 1})
+                        results.append(True)
+                        return
+                    except CheckoutError:
+                        results.append(False)
+                        return
+                    except OperationalError:
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(user,)) for user in buyers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+        self.assertEqual(len(results), len(buyers))
+        self.assertEqual(results.count(True), 5)
+        self.assertEqual(Order.objects.count(), 5)
+
+
+class SQLiteProfileTests(TestCase):
+    @override_settings(SQLITE_PRAGMAS=settings.SQLITE_PROFILES['production']['PRAGMAS'])
+    def test_production_profile(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DatabaseWrapper({
+                **connection.settings_dict, 'NAME': os.path.join(tmp, 'db.sqlite3'),
+                **settings.SQLITE_PROFILES['production']['DATABASE'],
+            }, alias='profile')
+            try:
+                with db.cursor() as cursor:
+                    pragmas = {name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                               for name in ('journal_mode', 'synchronous', 'busy_timeout')}
+            finally:
+                db.close()
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 20000})
+        self.assertEqual(db.transaction_mode, 'IMMEDIATE')
+
+
+class OrderStatsQuerySetTests(TestCase):
+    def setUp(self):
+        self.seller, self.products = make_catalogue()
+        self.buyer = User.objects.create_user('buyer')
+
+    def test_last_months_steps_calendar_months(self):
+        months = last_months(12, date(2026, 3, 31))
+        self.assertEqual(len(set(months)), 12)
+        self.assertEqual(months[0], date(2025, 4, 1))
+        self.assertEqual(months[-1], date(2026, 3, 1))
+        self.assertIn(date(2026, 2, 1), months)
+
+    def test_summary_is_a_single_query(self):
+        orders = place_orders(self.buyer, {str(p.pk): 1 for p in self.products})
+        Order.objects.filter(pk=orders[0].pk).update(status='delivered')
+        with self.assertNumQueries(1):
+            summary = Order.objects.filter(shop__owner=self.seller).summary()
+        self.assertEqual(summary['total_orders'], 2)
+        self.assertEqual(summary['pending_orders'], 1)
+        self.assertEqual(summary['delivered_orders'], 1)
+        self.assertEqual(summary['total_revenue'], orders[0].total)
+
+    def test_monthly_series_matches_rollup(self):
+        place_orders(self.buyer, {str(p.pk): 1 for p in self.products})
+        old = Order.objects.create(customer=self.buyer, shop=self.products[0].shop)
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=400))
+        with self.assertNumQueries(1):
+            labels, counts = Order.objects.monthly_series()
+        self.assertEqual(len(labels), 12)
+        self.assertEqual(counts[-1], 2)
+        self.assertEqual(sum(counts), 2)
+        call_command('rebuild_shop_stats', stdout=StringIO())
+        self.assertEqual(ShopDailyStats.objects.monthly_series(), (labels, counts))
+        self.assertEqual(ShopDailyStats.objects.summary()['total_orders'], 3)
+
+    def test_admin_changelist_shows_summary(self):
+        place_orders(self.buyer, {str(p.pk): 1 for p in self.products})
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', None)
+        self.client.force_login(admin_user)
+        response = self.client.get(reverse('admin:core_order_changelist'))
+        self.assertEqual(response.context['summary']['total_orders'], 2)
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller, self.products = make_catalogue()
+        self.buyer = User.objects.create_user('buyer')
+        self.client.force_login(self.seller)
+
+    def test_counter_follows_notifications(self):
+        place_orders(self.buyer, {str(p.pk): 1 for p in self.products})
+        self.assertEqual(unread_count(self.seller), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.seller), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_orders(self.buyer, {str(self.products[0].pk): 1})
+        self.assertEqual(unread_count(self.seller), 3)
+
+        notif = self.seller.notifications.first()
+        self.client.post(reverse('mark_notification_read', args=[notif.pk]))
+        self.client.post(reverse('mark_notification_read', args=[notif.pk]))
+        self.assertEqual(unread_count(self.seller), 2)
+
+        self.client.get(reverse('notifications'))
+        self.assertEqual(unread_count(self.seller), 0)
+        cache.clear()
+        self.assertEqual(unread_count(self.seller), 0)
+
+    def test_context_processor_is_lazy(self):
+        request = RequestFactory().get('/')
+        request.user = self.seller
+        with self.assertNumQueries(0):
+            context = notifications_ctx(request)
+        with self.assertNumQueries(1):
+            self.assertFalse(context['unread_notifs'] > 0)
+
+
+class NotificationDeliveryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller, self.products = make_catalogue()
+        self.buyer = User.objects.create_user('buyer')
+
+    def test_queue_writes_once(self):
+        with self.assertNumQueries(1):
+            queue([Notification(recipient=self.buyer, notif_type='order_shipped', message='Expédiée') for _ in range(20)])
+        self.assertEqual(self.buyer.notifications.count(), 20)
+
+    @override_settings(NOTIFICATION_DELIVERY='outbox')
+    def test_outbox_is_drained_by_worker(self):
+        place_orders(self.buyer, {str(p.pk): 1 for p in self.products})
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(NotificationOutbox.objects.count(), 2)
+        self.assertEqual(unread_count(self.seller), 0)
+
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('drain_notifications', batch_size=1, stdout=out)
+        self.assertIn('2 notification(s)', out.getvalue())
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertEqual(self.seller.notifications.filter(notif_type='new_order').count(), 2)
+        self.assertEqual(unread_count(self.seller), 2)
+
+
+class NotificationStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller, self.products = make_catalogue()
+        self.buyer = User.objects.create_user('buyer')
+
+    def test_wsgi_falls_back_to_polling(self):
+        self.client.force_login(self.seller)
+        self.assertEqual(self.client.get(reverse('notification_stream')).status_code, 204)
+
+    async def test_stream_pushes_notifications(self):
+        client = AsyncClient()
+        await client.aforce_login(self.seller)
+        response = await client.get(reverse('notification_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = response.streaming_content
+
+        async def next_event():
+            return (await asyncio.wait_for(anext(events), 5)).decode()
+
+        self.assertEqual(await next_event(), 'retry: 3000\n\n')
+        self.assertEqual(await next_event(), 'event: unread\ndata: {"unread": 0}\n\n')
+
+        def order():
+            with self.captureOnCommitCallbacks(execute=True):
+                place_orders(self.buyer, {str(self.products[0].pk): 1})
+        await sync_to_async(order)()
+        event = await next_event()
+        self.assertTrue(event.startswith('event: notification\n'))
+        self.assertEqual(json.loads(event.split('data: ')[1])['type'], 'new_order')
+        self.assertEqual(await next_event(), 'event: unread\ndata: {"unread": 1}\n\n')
+        await events.aclose()
+
+
+class BulkOrderStatusTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller, self.products = make_catalogue()
+        self.buyer = User.objects.create_user('buyer')
+        self.orders = []
+        for _ in range(3):
+            self.orders += place_orders(self.buyer, {str(p.pk): 1 for p in self.products})
+        Notification.objects.all().delete()
+        self.client.force_login(self.seller)
+
+    def post(self, order_ids, status='shipped'):
+        return self.client.post(
+            reverse('bulk_update_order_status'), {'order_ids': order_ids, 'status': status},
+            HTTP_ACCEPT='application/json',
+        )
+
+    def test_reports_per_order_results(self):
+        other_seller, other_products = make_catalogue(shop_count=1, products_per_shop=1, seller='other')
+        foreign = place_orders(self.buyer, {str(other_products[0].pk): 1})[0]
+        Order.objects.filter(pk=self.orders[1].pk).update(status='shipped')
+        response = self.post([self.orders[0].pk, self.orders[1].pk, foreign.pk, 999999])
+        self.assertEqual(response.json()['results'], {
+            str(self.orders[0].pk): 'ok',
+            str(self.orders[1].pk): 'inchangée',
+            str(foreign.pk): 'introuvable',
+            '999999': 'introuvable',
+        })
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.status, 'pending')
+        self.assertEqual(Notification.objects.filter(recipient=self.buyer, notif_type='order_shipped').count(), 1)
+
+    def test_out_of_range_ids_are_invalid(self):
+        response = self.post([self.orders[0].pk, '9' * 23])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.filter(status='shipped').count(), 0)
+
+    def test_constant_query_count(self):
+        with self.assertNumQueries(9):
+            self.post([self.orders[0].pk], 'delivered')
+        with self.assertNumQueries(9):
+            self.post([order.pk for order in self.orders[1:]], 'delivered')
+        self.assertEqual(Order.objects.filter(status='delivered').count(), len(self.orders))
+        self.assertEqual(Notification.objects.filter(recipient=self.buyer).count(), len(self.orders))
+        summary = ShopDailyStats.objects.summary()
+        self.assertEqual(summary['delivered_orders'], len(self.orders))
+        self.assertEqual(summary['pending_orders'], 0)
+        self.assertEqual(summary['total_revenue'], sum(order.total for order in self.orders))
+
+    def test_form_post_redirects_with_message(self):
+        response = self.client.post(
+            reverse('bulk_update_order_status'),
+            {'order_ids': [self.orders[0].pk], 'status': 'processing'}, follow=True,
+        )
+        self.assertRedirects(response, reverse('dashboard'))
+        self.assertContains(response, '1 commande(s) → En préparation')
+
+
+class MyOrdersPaginationTests(TestCase):
+    def setUp(self):
+        self.seller, self.products = make_catalogue(shop_count=1, products_per_shop=2, stock=100)
+        self.buyer = User.objects.create_user('buyer')
+        for _ in range(25):
+            place_orders(self.buyer, {str(p.pk): 1 for p in self.products})
+        # Ties on created_at must be broken by id.
+        Order.objects.filter(pk__lte=Order.objects.order_by('pk')[5].pk).update(created_at=timezone.now())
+        self.client.force_login(self.buyer)
+
+    def test_walks_whole_history_once(self):
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(reverse('my_orders_json'), {'cursor': cursor} if cursor else {})
+            data = response.json()
+            seen += [int(pk) for pk in re.findall(r'class="order-id">#(\d+)<', data['html'])]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        expected = list(Order.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_page_query_count_is_bounded(self):
+        response = self.client.get(reverse('my_orders'))
+        self.assertEqual(len(response.context['orders']), 10)
+        cursor = response.context['orders'].next_cursor
+        with self.assertNumQueries(4):
+            self.client.get(reverse('my_orders_json'), {'cursor': cursor})
+
+    def test_invalid_cursor(self):
+        self.assertRedirects(self.client.get(reverse('my_orders'), {'cursor': 'garbage'}), reverse('my_orders'))
+        self.assertEqual(self.client.get(reverse('my_orders_json'), {'cursor': 'W1td'}).status_code, 400)
+
+
+class CatalogueTests(TestCase):
+    def setUp(self):
+        self.seller, self.products = make_catalogue(shop_count=1, products_per_shop=30)
+        self.shop = self.products[0].shop
+        self.category = Category.objects.create(shop=self.shop, name='Lampes')
+        Product.objects.filter(pk__in=[p.pk for p in self.products[:4]]).update(category=self.category)
+        Product.objects.filter(pk=self.products[5].pk).update(stock=0)
+        cache.clear()
+
+    def walk(self, url, params, key):
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(url, {**params, 'cursor': cursor} if cursor else params)
+            page = response.context[key]
+            seen += [obj.pk for obj in page]
+            cursor = page.next_cursor
+            if not cursor:
+                return seen
+
+    def test_sorted_pages_cover_stock(self):
+        url = reverse('shop_detail', args=[self.shop.pk])
+        in_stock = self.shop.products.filter(stock__gt=0)
+        for sort, ordering in [('newest', ('-created_at', '-id')), ('-price', ('-price', '-id')), ('name', ('name', 'id'))]:
+            with self.subTest(sort):
+                expected = list(in_stock.order_by(*ordering).values_list('pk', flat=True))
+                self.assertEqual(self.walk(url, {'sort': sort}, 'products'), expected)
+        self.assertEqual(
+            sorted(self.walk(url, {'category': self.category.pk, 'sort': 'price'}, 'products')),
+            [p.pk for p in self.products[:4]],
+        )
+
+    def test_pages_skip_description(self):
+        url = reverse('shop_detail', args=[self.shop.pk])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'sort': 'price'})
+        self.assertEqual(len(response.context['products']), 24)
+        self.assertContains(response, 'sort=price&amp;cursor=')
+        product_query = next(q['sql'] for q in queries if 'FROM "core_product"' in q['sql'])
+        self.assertNotRegex(product_query, r'(?<!SUBSTR\()"core_product"\."description"')
+
+    def test_shop_list(self):
+        Shop.objects.bulk_create([Shop(owner=self.seller, name=f'Boutique {i:02}') for i in range(30)])
+        seen = self.walk(reverse('shop_list'), {'sort': 'name'}, 'shops')
+        self.assertEqual(seen, list(Shop.objects.order_by('name', 'id').values_list('pk', flat=True)))
+        self.client.force_login(self.seller)
+        response = self.client.get(reverse('shop_list'), {'sort': 'name'})
+        counts = {shop.pk: shop.product_count for shop in response.context['shops']}
+        self.assertEqual(counts[self.shop.pk], 30)
+
+    def test_invalid_cursor(self):
+        url = reverse('shop_detail', args=[self.shop.pk])
+        self.assertRedirects(self.client.get(url, {'cursor': 'garbage'}), url)
+
+
+class PublicPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.seller, self.products = make_catalogue(shop_count=1, products_per_shop=2)
+        self.product = self.products[0]
+        self.buyer = User.objects.create_user('buyer')
+
+    def get(self, name, *args, client=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return (client or self.client).get(reverse(name, args=args))
+
+    def test_anonymous_pages_come_from_cache(self):
+        for name, args in [('home', []), ('shop_list', []), ('shop_detail', [self.product.shop_id]),
+                           ('product_detail', [self.product.pk])]:
+            with self.subTest(name):
+                first = self.get(name, *args)
+                with self.assertNumQueries(0):
+                    second = self.get(name, *args)
+                self.assertEqual(first.content, second.content)
+
+    def test_checkout_refreshes_stock(self):
+        self.assertContains(self.get('product_detail', self.product.pk), 'Stock limité (10)')
+        with self.captureOnCommitCallbacks(execute=True):
+            place_orders(self.buyer, {str(self.product.pk): 3})
+        self.assertContains(self.get('product_detail', self.product.pk), 'Stock limité (7)')
+        self.assertContains(self.get('shop_detail', self.product.shop_id), '7 en stock')
+
+    def test_model_writes_invalidate_dependent_pages(self):
+        self.get('shop_detail', self.product.shop_id)
+        self.get('product_detail', self.products[1].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Lampe'
+            self.product.save()
+            Category.objects.create(shop=self.product.shop, name='Éclairage')
+            self.products[1].category = Category.objects.get()
+            self.products[1].save()
+        self.assertContains(self.get('shop_detail', self.product.shop_id), 'Lampe')
+        self.assertContains(self.get('product_detail', self.products[1].pk), 'Éclairage')
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.update(name='Luminaires')
+            Category.objects.get().save()
+        self.assertContains(self.get('product_detail', self.products[1].pk), 'Luminaires')
+
+    def test_category_changes_bump_only_its_products(self):
+        category = Category.objects.create(shop=self.product.shop, name='Éclairage')
+        Product.objects.filter(pk=self.product.pk).update(category=category)
+        for write in (category.save, category.delete):
+            with self.subTest(write.__name__):
+                with mock.patch('core.caching.bump') as bump_scopes:
+                    with self.captureOnCommitCallbacks(execute=True):
+                        write()
+                scopes = bump_scopes.call_args.args[0]
+                self.assertIn(product_scope(self.product.pk), scopes)
+                self.assertNotIn(product_scope(self.products[1].pk), scopes)
+
+    def test_logged_in_users_share_fragments_only(self):
+        client = Client()
+        client.force_login(self.buyer)
+        self.get('product_detail', self.product.pk)
+        response = self.get('product_detail', self.product.pk, client=client)
+        self.assertContains(response, 'Ajouter au panier')
+        self.get('home', client=client)
+        # A queryset update sends no signal, so the card fragment stays stale...
+        Product.objects.filter(pk=self.product.pk).update(name='Lampe')
+        self.assertNotContains(self.get('home', client=client), '<h3>Lampe</h3>')
+        # ...until the product is saved.
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=self.product.pk).save()
+        self.assertContains(self.get('home', client=client), '<h3>Lampe</h3>')
+        self.assertContains(self.get('home'), 'Connexion')
+
+    async def test_pages_render_over_asgi(self):
+        await sync_to_async(place_orders)(self.buyer, {str(self.product.pk): 1})
+        client = AsyncClient()
+        await client.aforce_login(self.seller)
+        for name, args in [('home', []), ('shop_list', []), ('shop_detail', [self.product.shop_id]),
+                           ('product_detail', [self.product.pk])]:
+            with self.subTest(name):
+                response = await client.get(reverse(name, args=args))
+                self.assertContains(response, '<span class="notif-badge">1</span>')
+        self.assertContains(await AsyncClient().get(reverse('home')), 'Connexion')
+        response = await client.get(reverse('unread_notifications'))
+        self.assertEqual(response.json(), {'unread': 1})
+
+    async def test_templates_render_off_the_event_loop(self):
+        loops = []
+
+        def spy(*args, **kwargs):
+            try:
+                loops.append(asyncio.get_running_loop())
+            except RuntimeError:
+                loops.append(None)
+            return render(*args, **kwargs)
+
+        with mock.patch('core.views.render', spy):
+            await AsyncClient().get(reverse('product_detail', args=[self.product.pk]))
+        self.assertEqual(loops, [None])
+
+
+class SiteCounterTests(TestCase):
+    def setUp(self):
+        self.seller, self.products = make_catalogue()
+        self.buyer = User.objects.create_user('buyer')
+
+    def test_signals_and_status_changes_keep_totals(self):
+        self.assertEqual(totals(), {'products': 6, 'shops': 2, 'users': 2, 'delivered_orders': 0})
+        orders = place_orders(self.buyer, {str(self.products[0].pk): 1, str(self.products[3].pk): 1})
+        bulk_update_status(self.seller, [order.pk for order in orders], 'delivered')
+        self.assertEqual(totals()['delivered_orders'], 2)
+        self.client.force_login(self.seller)
+        self.client.post(reverse('update_order_status', args=[orders[0].pk]), {'status': 'cancelled'})
+        self.assertEqual(totals()['delivered_orders'], 1)
+        self.products[1].delete()
+        orders[1].shop.delete()
+        self.assertEqual(totals(), {'products': 2, 'shops': 1, 'users': 2, 'delivered_orders': 0})
+
+    def test_home_reads_counters(self):
+        SiteCounter.objects.filter(name='products').update(value=1234)
+        self.client.force_login(self.buyer)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['total_products'], 1234)
+        self.assertFalse([q['sql'] for q in queries if 'COUNT(' in q['sql'] and 'core_notification' not in q['sql']])
+
+    def test_reconcile_fixes_drift(self):
+        Product.objects.bulk_create([Product(shop=self.products[0].shop, name='Lot', description='', price=1)])
+        SiteCounter.objects.filter(name='users').delete()
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('products : +1', out.getvalue())
+        self.assertEqual(totals(), {'products': 7, 'shops': 2, 'users': 2, 'delivered_orders': 0})
+
+
+def make_image(size=(1600, 1000), mode='RGBA', fmt='PNG', name='photo.png'):
+    buffer = BytesIO()
+    Image.new(mode, size, (200, 30, 30, 128) if mode == 'RGBA' else (200, 30, 30)).save(buffer, fmt)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{fmt.lower()}')
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.media = media.name
+        self.seller, (self.product, *_) = make_catalogue(shop_count=1, products_per_shop=1)
+        self.client.force_login(self.seller)
+
+    def open(self, name):
+        return Image.open(f'{self.media}/{name}')
+
+    def test_upload_writes_every_size(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('add_product', args=[self.product.shop_id]), {
+                'name': 'Affiche', 'description': 'Grande affiche', 'price': '12', 'stock': '3',
+                'image': make_image(),
+            })
+        image = Product.objects.get(name='Affiche').image
+        card = self.open(derivative_name(image.name, 'card', 'webp'))
+        self.assertEqual((card.format, card.size), ('WEBP', (480, 360)))
+        large = self.open(derivative_name(image.name, 'large', 'jpg'))
+        self.assertEqual((large.format, large.mode, large.size), ('JPEG', 'RGB', (1200, 750)))
+        # Small originals are never upscaled.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('create_shop'), {'name': 'Atelier', 'logo': make_image((200, 100))})
+        logo = Shop.objects.get(name='Atelier').logo
+        self.assertEqual(self.open(derivative_name(logo.name, 'banner', 'jpg')).size, (200, 100))
+
+    def test_lazy_generation_and_fallback(self):
+        # Stored without a save, like the images marked ready by migration 0013.
+        self.product.image = default_storage.save('products/photo.jpg', make_image(mode='RGB', fmt='JPEG'))
+        self.product.image_status = 'ready'
+        Product.objects.filter(pk=self.product.pk).update(image=self.product.image.name, image_status='ready')
+        html = self.client.get(reverse('product_detail', args=[self.product.pk])).content.decode()
+        self.assertIn(derivative_name(self.product.image.name, 'large', 'webp'), html)
+        self.assertNotIn(f'src="{self.product.image.url}"', html)
+
+        self.product.image = SimpleUploadedFile('broken.jpg', b'not an image')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        self.assertEqual(self.product.image_status, 'failed')
+        self.assertEqual(derivative_url(self.product.image, 'card'), self.product.image.url)
+
+    def test_images_saved_outside_the_views_are_processed(self):
+        # E.g. from the admin: the upload resets the status and is processed after the commit.
+        with self.captureOnCommitCallbacks(execute=True):
+            shop = Shop.objects.create(owner=self.seller, name='Atelier', logo=make_image(), logo_status='ready')
+            self.assertEqual(shop.logo_status, 'pending')
+        self.assertEqual(Shop.objects.get(pk=shop.pk).logo_status, 'ready')
+        self.assertTrue(default_storage.exists(derivative_name(shop.logo.name, 'banner', 'webp')))
+
+    @override_settings(IMAGE_PROCESSING='queue')
+    def test_queued_uploads_show_placeholder_until_processed(self):
+        self.client.post(reverse('add_product', args=[self.product.shop_id]), {
+            'name': 'Affiche', 'description': 'Grande affiche', 'price': '12', 'stock': '3', 'image': make_image(),
+        })
+        product = Product.objects.get(name='Affiche')
+        self.assertEqual(product.image_status, 'pending')
+        self.assertFalse(os.path.exists(f'{self.media}/{DERIVATIVES_DIR}'))
+        page = reverse('product_detail', args=[product.pk])
+        self.assertContains(self.client.get(page), PLACEHOLDER)
+
+        broken = Product.objects.create(
+            shop=self.product.shop, name='Cassé', description='', price=1,
+            image=SimpleUploadedFile('broken.jpg', b'not an image'),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_pending(workers=0), (1, 1))
+        product.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertEqual((product.image_status, broken.image_status), ('ready', 'failed'))
+        self.assertContains(self.client.get(page), derivative_name(product.image.name, 'large', 'webp'))
+        self.assertEqual(derivative_url(broken.image, 'card'), broken.image.url)
+
+    def test_backfill_uses_a_process_pool(self):
+        Shop.objects.filter(pk=self.product.shop_id).update(logo=default_storage.save('shops/logo.png', make_image()))
+        out = StringIO()
+        call_command('backfill_images', '--missing-only', '--workers', '2', stdout=out)
+        self.assertIn('1 image(s) traitée(s), 0 en échec', out.getvalue())
+        shop = Shop.objects.get(pk=self.product.shop_id)
+        self.assertEqual(shop.logo_status, 'ready')
+        self.assertTrue(default_storage.exists(derivative_name(shop.logo.name, 'banner', 'webp')))
+        call_command('backfill_images', '--missing-only', '--workers', '0', stdout=out)
+        self.assertIn('0 image(s) à traiter', out.getvalue())
+
+    def test_requeued_images_keep_their_derivatives_until_regenerated(self):
+        name = default_storage.save('products/photo.png', make_image())
+        Product.objects.filter(pk=self.product.pk).update(image=name, image_status='pending')
+        page = reverse('product_detail', args=[self.product.pk])
+        self.assertContains(self.client.get(page), PLACEHOLDER)
+        process_pending(workers=0)
+        # A full backfill puts every image back to pending while the pool runs.
+        requeue()
+        self.assertEqual(Product.objects.get(pk=self.product.pk).image_status, 'pending')
+        html = self.client.get(page).content.decode()
+        self.assertIn(derivative_name(name, 'large', 'webp'), html)
+        self.assertNotIn(PLACEHOLDER, html)
+
+
+class ProductImportExportTests(TestCase):
+    def setUp(self):
+        self.seller, self.products = make_catalogue(shop_count=1, products_per_shop=2)
+        self.shop = self.products[0].shop
+        self.client.force_login(self.seller)
+
+    def csv_file(self, rows):
+        lines = ['name,description,price,stock,category'] + [','.join(map(str, row)) for row in rows]
+        return BytesIO('\n'.join(lines).encode())
+
+    def test_streams_in_batches(self):
+        rows = [(f'Article {i}', 'Lot', '4.50', i % 7, f'Rayon {i % 3}') for i in range(1200)]
+        rows += [('Produit 0-0', 'Mis à jour', '99.00', 1, 'rayon 0'), ('Sans prix', 'x', 'abc', 1, ''), ('', 'x', 1, 1, '')]
+        with CaptureQueriesContext(connection) as queries:
+            report = import_products(self.shop, self.csv_file(rows), 'csv', batch_size=500)
+        self.assertEqual((report.created, report.updated, report.failed), (1200, 1, 2))
+        self.assertEqual([line for line, _ in report.errors], [1203, 1204])
+        self.assertLess(len(queries), 40)
+        self.assertEqual(sorted(self.shop.categories.values_list('name', flat=True)), ['Rayon 0', 'Rayon 1', 'Rayon 2'])
+        updated = Product.objects.get(pk=self.products[0].pk)
+        self.assertEqual((updated.price, updated.category.name), (Decimal('99.00'), 'Rayon 0'))
+        self.assertEqual(totals()['products'], 1202)
+
+    def test_upload_jsonl_and_round_trip(self):
+        upload = SimpleUploadedFile('catalogue.jsonl', b'\n'.join([
+            json.dumps({'name': 'Bol', 'description': 'Grès', 'price': 12.5, 'stock': 4, 'category': 'Cuisine'}).encode(),
+            b'{pas du json',
+        ]))
+        response = self.client.post(reverse('import_products', args=[self.shop.pk]), {'file': upload})
+        self.assertContains(response, 'Ligne 2')
+        self.assertEqual(self.shop.products.get(name='Bol').category.name, 'Cuisine')
+
+        response = self.client.get(reverse('export_products', args=[self.shop.pk]))
+        exported = b''.join(response.streaming_content)
+        other = Shop.objects.create(owner=self.seller, name='Copie')
+        report = import_products(other, BytesIO(exported), 'csv')
+        self.assertEqual((report.created, report.failed), (3, 0))
+        self.assertEqual(
+            sorted(other.products.values_list('name', 'price', 'stock', 'category__name')),
+            sorted(self.shop.products.values_list('name', 'price', 'stock', 'category__name')),
+        )
+
+    @override_settings(PRODUCT_IMPORT_BATCH_SIZE=2)
+    def test_non_utf8_file_is_rejected_before_any_write(self):
+        rows = [(f'Article {i}', 'Lot', '4.50', 1, '') for i in range(3)] + [('Café', 'Thé', '3.00', 1, '')]
+        upload = SimpleUploadedFile('catalogue.csv', self.csv_file(rows).getvalue().decode().encode('cp1252'))
+        response = self.client.post(reverse('import_products', args=[self.shop.pk]), {'file': upload})
+        self.assertContains(response, 'Ligne 5')
+        self.assertContains(response, 'UTF-8')
+        self.assertFalse(self.shop.products.filter(name__startswith='Article').exists())
+
+    def test_order_export(self):
+        buyer = User.objects.create_user('buyer')
+        place_orders(buyer, {str(self.products[0].pk): 2, str(self.products[1].pk): 1})
+        response = self.client.get(reverse('export_orders', args=[self.shop.pk]), {'format': 'jsonl'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([(line['product'], line['quantity']) for line in lines], [('Produit 0-0', 2), ('Produit 0-1', 1)])
+        other = User.objects.create_user('other')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(reverse('export_orders', args=[self.shop.pk])).status_code, 404)
+
+
+class OrderReportTests(TestCase):
+    def setUp(self):
+        self.seller, self.products = make_catalogue(shop_count=2, products_per_shop=2, stock=100)
+        self.shop = self.products[0].shop
+        buyer = User.objects.create_user('buyer')
+        orders = [place_orders(buyer, {str(self.products[0].pk): 2, str(self.products[2].pk): 1})[0] for _ in range(3)]
+        orders.append(place_orders(buyer, {str(self.products[1].pk): 5})[0])
+        bulk_update_status(self.seller, [orders[0].pk, orders[1].pk], 'delivered')
+        bulk_update_status(self.seller, [orders[2].pk], 'cancelled')
+        Order.objects.filter(pk=orders[3].pk).update(created_at=timezone.now() - timedelta(days=40))
+        self.client.force_login(self.seller)
+        self.url = reverse('order_report', args=[self.shop.pk])
+
+    def download(self, **params):
+        response = self.client.get(self.url, params)
+        return list(csv.DictReader(line.decode() for line in response.streaming_content))
+
+    def test_product_totals(self):
+        rows = self.download(download='products', start=(timezone.localdate() - timedelta(days=60)).isoformat())
+        self.assertEqual(
+            [(row['product'], row['orders'], row['quantity_ordered'], row['quantity_delivered'], row['revenue'])
+             for row in rows],
+            [('Produit 0-0', '2', '4', '4', '40.00'), ('Produit 0-1', '1', '5', '0', '0.00')],
+        )
+        page = self.client.get(self.url)
+        self.assertEqual([row['product__name'] for row in page.context['totals']], ['Produit 0-0'])
+
+    def test_line_export_respects_period(self):
+        today = timezone.localdate().isoformat()
+        rows = self.download(download='lines', start=today, end=today)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row['product'] for row in rows}, {'Produit 0-0'})
+        self.assertEqual(rows[0]['line_total'], '20.00')
+        self.assertEqual(len(self.download(download='lines')), 3)
+        self.assertEqual(len(self.download(download='lines', start='')), 4)
+        response = self.client.get(self.url, {'start': today, 'end': '2000-01-01'})
+        self.assertContains(response, 'La date de fin doit suivre la date de début.')
+
+    def test_streams_without_instances(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows = self.download(download='lines', start='2000-01-01')
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(len([q for q in queries if 'core_orderitem' in q['sql']]), 1)
+
+
+class NotificationInboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('buyer')
+        queue([Notification(recipient=self.user, notif_type='order_shipped', message=f'Message {i}') for i in range(45)])
+        self.client.force_login(self.user)
+
+    def test_marks_only_the_shown_page(self):
+        response = self.client.get(reverse('notifications'))
+        self.assertEqual(len(response.context['notifs']), 20)
+        self.assertEqual(self.user.notifications.filter(is_read=False).count(), 25)
+        self.assertEqual(unread_count(self.user), 25)
+        self.client.get(reverse('notifications'), {'cursor': response.context['notifs'].next_cursor})
+        self.assertEqual(unread_count(self.user), 5)
+
+    def test_purge_archives_old_read_notifications(self):
+        self.client.get(reverse('notifications'))
+        Notification.objects.update(created_at=timezone.now() - timedelta(days=100))
+        with tempfile.NamedTemporaryFile('r', suffix='.jsonl') as archive:
+            call_command('purge_notifications', days=90, batch_size=7, archive=archive.name, stdout=StringIO())
+            archived = [json.loads(line) for line in archive]
+        self.assertEqual(len(archived), 20)
+        self.assertEqual(self.user.notifications.count(), 25)
+        self.assertFalse(self.user.notifications.filter(is_read=True).exists())
+
+    def test_dashboard_pages_incoming_orders(self):
+        seller, products = make_catalogue(shop_count=1, products_per_shop=1, stock=100)
+        for _ in range(25):
+            place_orders(self.user, {str(products[0].pk): 1})
+        self.client.force_login(seller)
+        first = self.client.get(reverse('dashboard')).context['incoming_orders']
+        second = self.client.get(reverse('dashboard'), {'orders_cursor': first.next_cursor}).context['incoming_orders']
+        self.assertEqual(len(first) + len(second), 25)
+        self.assertFalse(second.has_next)
+
+    def test_transferred_shop_hands_its_orders_over(self):
+        seller, products = make_catalogue(shop_count=1, products_per_shop=1)
+        order = place_orders(self.user, {str(products[0].pk): 1})[0]
+        buyer = User.objects.create_user('repreneur')
+        shop = products[0].shop
+        shop.owner = buyer
+        shop.save()
+        self.client.force_login(seller)
+        self.assertEqual(len(self.client.get(reverse('dashboard')).context['incoming_orders']), 0)
+        self.client.force_login(buyer)
+        self.assertEqual(list(self.client.get(reverse('dashboard')).context['incoming_orders'].items), [order])
+        self.client.post(reverse('update_order_status', args=[order.pk]), {'status': 'shipped'})
+        order.refresh_from_db()
+        self.assertEqual((order.seller, order.status), (buyer, 'shipped'))
+
+
+class QueryPlanTests(TestCase):
+    """Every query the hot views run must be answered from an index.
+
+    The queries are captured while the views run. SQLite reports a full
+    table walk as ``SCAN <table>``; ``SCAN <table> USING INDEX`` walks a
+    whole index and is only accepted when a ``LIMIT`` stops it early. A
+    keyset page (``ORDER BY … id LIMIT n``) must not be sorted in a ``TEMP
+    B-TREE``, which reads every matching row before returning the first.
+    """
+
+    # Tables with a fixed handful of rows, read whole on purpose.
+    SMALL_TABLES = {'core_sitecounter'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller, cls.products = make_catalogue()
+        cls.buyer = User.objects.create_user('buyer')
+        place_orders(cls.buyer, {str(p.pk): 1 for p in cls.products})
+        Category.objects.create(shop=cls.products[0].shop, name='Thés')
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndexes(self, sql):
+        plan = self.plan(sql)
+        limited = re.search(r'\bLIMIT \d+$', sql)
+        keyset_page = re.search(r'ORDER BY .*"id" (ASC|DESC) LIMIT \d+$', sql)
+        problems = [
+            line for line in plan
+            if re.match(r'SCAN (core_\w+)$', line) and line.split()[1] not in self.SMALL_TABLES
+            or re.match(r'SCAN core_\w+ USING', line) and not limited
+            or line.startswith('USE TEMP B-TREE FOR ORDER BY') and keyset_page
+        ]
+        self.assertFalse(problems, '\n'.join([sql, *plan]))
+
+    def cursor(self, queryset, ordering=('-created_at', '-id')):
+        return encode_cursor(queryset.order_by(*ordering).first(), ordering)
+
+    def requests(self):
+        shop, product = self.products[0].shop, self.products[0]
+        category = shop.categories.get()
+        return [
+            ('home', None, 'get', [], {}),
+            ('shop_list', None, 'get', [], {}),
+            ('shop_list', None, 'get', [], {'sort': 'name', 'cursor': self.cursor(Shop.objects, ('name', 'id'))}),
+            ('shop_list', None, 'get', [], {'cursor': self.cursor(Shop.objects)}),
+            ('shop_detail', None, 'get', [shop.pk], {}),
+            ('shop_detail', None, 'get', [shop.pk], {'sort': 'price', 'category': category.pk}),
+            ('shop_detail', None, 'get', [shop.pk], {'sort': '-price'}),
+            ('shop_detail', None, 'get', [shop.pk], {'sort': 'name', 'cursor': self.cursor(
+                shop.products, ('name', 'id'))}),
+            ('shop_detail', None, 'get', [shop.pk], {'cursor': self.cursor(shop.products)}),
+            ('product_detail', None, 'get', [product.pk], {}),
+            ('dashboard', self.seller, 'get', [], {}),
+            ('dashboard', self.seller, 'get', [], {'orders_cursor': self.cursor(Order.objects)}),
+            ('my_orders', self.buyer, 'get', [], {}),
+            ('my_orders_json', self.buyer, 'get', [], {'cursor': self.cursor(self.buyer.orders)}),
+            ('notifications', self.seller, 'get', [], {}),
+            ('notifications', self.seller, 'get', [], {'cursor': self.cursor(self.seller.notifications)}),
+            ('unread_notifications', self.seller, 'get', [], {}),
+            ('add_to_cart', self.buyer, 'post', [product.pk], {}),
+            ('cart_detail', self.buyer, 'get', [], {}),
+            ('checkout', self.buyer, 'post', [], {}),
+        ]
+
+    def captured(self):
+        for name, user, method, args, data in self.requests():
+            self.client.logout()
+            if user is not None:
+                self.client.force_login(user)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                getattr(self.client, method)(reverse(name, args=args), data)
+            yield name, queries
+        with CaptureQueriesContext(connection) as queries:
+            call_command('release_holds', stdout=StringIO())
+        yield 'release_holds', queries
+
+    def test_hot_queries_use_indexes(self):
+        for name, queries in self.captured():
+            for query in queries:
+                sql = query['sql']
+                if re.match(r'\s*(SELECT|UPDATE|DELETE)\b', sql) and 'core_' in sql:
+                    with self.subTest(name, sql=sql):
+                        self.assertUsesIndexes(sql)
+
+
+class QueryBudgetTests(TestCase):
+    """Every URL in ``core.urls`` must run a bounded number of SQL queries.
+
+    Each view is measured against a small store and again after the same
+    users have gained many more shops, products, orders and notifications;
+    the count must not move and must stay within ``BUDGETS``.
+    """
+
+    BUDGETS = {
+        'home': 2,
+        'shop_list': 2,
+        'shop_detail': 3,
+        'product_detail': 1,
+        'search': 2,
+        'register': 0,
+        'login': 0,
+        'logout': 4,
+        'dashboard': 12,
+        'create_shop': 3,
+        'add_product': 6,
+        'update_order_status': 8,
+        'bulk_update_order_status': 8,
+        'my_orders': 5,
+        'my_orders_json': 4,
+        'notifications': 5,
+        'unread_notifications': 3,
+        'notification_stream': 2,
+        'mark_notification_read': 3,
+        'cart_detail': 5,
+        'add_to_cart': 11,
+        'remove_from_cart': 2,
+        'import_products': 4,
+        'export_products': 3,
+        'export_orders': 3,
+        'order_report': 5,
+        'checkout': 16,
+    }
+
+    def setUp(self):
+        self.seller = User.objects.create_user('seller')
+        self.buyer = User.objects.create_user('buyer')
+        self.seed(2)
+
+    def seed(self, scale):
+        shops = Shop.objects.bulk_create([
+            Shop(owner=self.seller, name=f'Boutique {len(self.seller.shops.all()) + i}') for i in range(scale)
+        ])
+        categories = Category.objects.bulk_create([Category(shop=shop, name='Catégorie') for shop in shops])
+        products = Product.objects.bulk_create([
+            Product(shop=shop, category=category, name=f'Produit {i}', description='…', price=Decimal('9.90'), stock=50)
+            for shop, category in zip(shops, categories) for i in range(scale * 3)
+        ])
+        for start in range(0, scale * 2, 2):
+            place_orders(self.buyer, {str(p.pk): 1 for p in products[start:start + 2 * scale]})
+        queue([
+            Notification(recipient=user, notif_type=notif_type, message=f'Notification {i}')
+            for i in range(scale * 10)
+            for user, notif_type in [(self.buyer, 'order_shipped'), (self.seller, 'new_order')]
+        ])
+        self.product = products[-1]
+        self.shop = shops[-1]
+        self.order = Order.objects.filter(shop__owner=self.seller).latest('pk')
+        self.notif = self.buyer.notifications.latest('pk')
+        self.cart = products[:scale * 3]
+
+    def requests(self):
+        """``(url name, user, method, args, data, cart products)`` for every route."""
+        return [
+            ('home', None, 'get', [], {}, None),
+            ('shop_list', None, 'get', [], {}, None),
+            ('shop_detail', None, 'get', [self.shop.pk], {}, None),
+            ('product_detail', None, 'get', [self.product.pk], {}, None),
+            ('search', None, 'get', [], {'q': 'produit', 'max_price': '20'}, None),
+            ('register', None, 'get', [], {}, None),
+            ('login', None, 'get', [], {}, None),
+            ('logout', self.buyer, 'post', [], {}, None),
+            ('dashboard', self.seller, 'get', [], {}, None),
+            ('create_shop', self.seller, 'get', [], {}, None),
+            ('add_product', self.seller, 'get', [self.shop.pk], {}, None),
+            ('import_products', self.seller, 'get', [self.shop.pk], {}, None),
+            ('export_products', self.seller, 'get', [self.shop.pk], {}, None),
+            ('export_orders', self.seller, 'get', [self.shop.pk], {'format': 'jsonl'}, None),
+            ('order_report', self.seller, 'get', [self.shop.pk], {}, None),
+            ('update_order_status', self.seller, 'post', [self.order.pk], {'status': 'processing'}, None),
+            ('bulk_update_order_status', self.seller, 'post', [],
+             {'order_ids': list(Order.objects.values_list('pk', flat=True)), 'status': 'shipped'}, None),
+            ('my_orders', self.buyer, 'get', [], {}, None),
+            ('my_orders_json', self.buyer, 'get', [], {}, None),
+            ('notifications', self.buyer, 'get', [], {}, None),
+            ('unread_notifications', self.buyer, 'get', [], {}, None),
+            ('notification_stream', self.buyer, 'get', [], {}, None),
+            ('mark_notification_read', self.buyer, 'post', [self.notif.pk], {}, None),
+            ('cart_detail', self.buyer, 'get', [], {}, self.cart),
+            ('add_to_cart', self.buyer, 'post', [self.product.pk], {}, self.cart),
+            ('remove_from_cart', self.buyer, 'post', [self.product.pk], {}, self.cart),
+            ('checkout', self.buyer, 'post', [], {}, self.cart),
+        ]
+
+    def measure(self):
+        counts = {}
+        for name, user, method, args, data, cart in self.requests():
+            self.client.logout()
+            if user is not None:
+                self.client.force_login(user)
+            if cart is not None:
+                session = self.client.session
+                session_cart = Cart(session)
+                session_cart.clear()
+                for product in cart:
+                    session_cart.add(product)
+                session.save()
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(self.client, method)(reverse(name, args=args), data)
+            self.assertLess(response.status_code, 400, name)
+            counts[name] = len(queries)
+        return counts
+
+    def test_budgets_cover_every_route(self):
+        from . import urls
+        self.assertEqual({pattern.name for pattern in urls.urlpatterns}, set(self.BUDGETS))
+        self.assertEqual({request[0] for request in self.requests()}, set(self.BUDGETS))
+
+    def test_query_count_is_bounded_and_flat(self):
+        small = self.measure()
+        self.seed(12)
+        large = self.measure()
+        for name, budget in self.BUDGETS.items():
+            with self.subTest(name):
+                self.assertLessEqual(small[name], budget)
+                self.assertEqual(small[name], large[name])
+
+
+class CartTests(TestCase):
+    def setUp(self):
+        self.seller, self.products = make_catalogue()
+        self.client.force_login(User.objects.create_user('buyer'))
+
+    def fill_cart(self):
+        for product in self.products:
+            self.client.post(reverse('add_to_cart', args=[product.pk]))
+        self.client.post(reverse('add_to_cart', args=[self.products[0].pk]))
+
+    def test_summary_needs_no_product_query(self):
+        self.fill_cart()
+        cart = Cart(self.client.session)
+        with self.assertNumQueries(0):
+            summary = cart.summary()
+        self.assertEqual(summary['lines'], len(self.products))
+        self.assertEqual(summary['count'], len(self.products) + 1)
+        self.assertEqual(summary['total'], sum(p.price for p in self.products) + self.products[0].price)
+
+    def test_hydration_prunes_deleted_products_once(self):
+        self.fill_cart()
+        self.products[1].delete()
+        response = self.client.get(reverse('cart_detail'))
+        self.assertEqual(len(response.context['items']), len(self.products) - 1)
+        self.assertNotIn(str(self.products[1].pk), self.client.session['cart'])
+        self.assertNotIn(str(self.products[1].pk), self.client.session['cart_prices'])
+        session = self.client.session
+        cart = Cart(session)
+        with self.assertNumQueries(1):
+            cart.lines()
+        self.assertFalse(session.modified)
+
+    def test_navbar_badge(self):
+        self.fill_cart()
+        response = self.client.get(reverse('shop_list'))
+        self.assertContains(response, f'<span class="cart-badge">{len(self.products)}</span>', html=True)
+
+
+@override_settings(REPLICA_DATABASE='replica')
+class ReplicaRoutingTests(TestCase):
+    def route(self, request, write=False):
+        seen = {}
+
+        def view(request):
+            seen['read'] = router.db_for_read(Product)
+            seen['session'] = router.db_for_read(Session)
+            if write:
+                router.db_for_write(Session)
+                seen['after_write'] = router.db_for_read(Product)
+            with transaction.atomic():
+                seen['in_transaction'] = router.db_for_read(Product)
+            return HttpResponse()
+
+        return seen, replica_middleware(view)(request)
+
+    def test_safe_requests_read_the_replica(self):
+        seen, response = self.route(RequestFactory().get('/'))
+        self.assertEqual(seen, {'read': 'replica', 'session': 'default', 'in_transaction': 'default'})
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+        self.assertEqual(router.db_for_read(Product), 'default')
+
+    def test_writes_stick_to_the_primary(self):
+        seen, response = self.route(RequestFactory().get('/'), write=True)
+        self.assertEqual((seen['read'], seen['after_write']), ('replica', 'default'))
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+        request = RequestFactory().get('/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        self.assertEqual(self.route(request)[0]['read'], 'default')
+        self.assertEqual(self.route(RequestFactory().post('/'))[0]['read'], 'default')
+
+    def test_cart_views_never_read_the_replica(self):
+        seller, products = make_catalogue(shop_count=1, products_per_shop=1)
+        client = Client()
+        client.force_login(User.objects.create_user('buyer'))
+        routes = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            routes.append((model._meta.model_name, db_for_read(router, model, **hints)))
+            return 'default'
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', spy):
+            client.get(reverse('shop_detail', args=[products[0].shop_id]))
+            self.assertIn(('product', 'replica'), routes)
+            # The sticky cookie would hide the views' own routing.
+            for url in ('add_to_cart', 'remove_from_cart', 'add_to_cart', 'checkout'):
+                client.cookies.pop(STICKY_COOKIE, None)
+                routes.clear()
+                args = [] if url == 'checkout' else [products[0].pk]
+                with self.captureOnCommitCallbacks(execute=True):
+                    client.post(reverse(url, args=args))
+                self.assertTrue(routes)
+                self.assertNotIn('replica', [db for model, db in routes], (url, routes))
+        self.assertEqual(Order.objects.filter(customer__username='buyer').count(), 1)
+
+    def test_streamed_exports_read_the_replica(self):
+        seller, products = make_catalogue(shop_count=1, products_per_shop=2)
+        self.client.force_login(seller)
+        routes = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            routes.append((model._meta.model_name, db_for_read(router, model, **hints)))
+            return 'default'
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', spy):
+            for url in ('export_products', 'export_orders'):
+                response = self.client.get(reverse(url, args=[products[0].shop_id]))
+                routes.clear()
+                b''.join(response.streaming_content)
+                self.assertTrue(routes, url)
+                self.assertEqual({db for model, db in routes}, {'replica'}, url)
+
+    def test_replica_counts_are_not_cached(self):
+        cache.clear()
+        user = User.objects.create_user('buyer')
+        with replica_reads():
+            with mock.patch.object(ReplicaRouter, 'db_for_read', return_value='default'):
+                self.assertEqual(unread_count(user), 0)
+        self.assertIsNone(cache.get(f'unread_notifs:{user.pk}'))
+
+    def test_cache_keys_follow_replica_copies(self):
+        product = Product(pk=1)
+        with replica_reads():
+            first = with_versions([product], lambda pk: f'product:{pk}')[0].cache_version
+            bump([REPLICA])
+            second = with_versions([product], lambda pk: f'product:{pk}')[0].cache_version
+        self.assertNotEqual(first, second)
+        self.assertEqual(first.split('.')[0], second.split('.')[0])
+
+    def test_sync_replica_copies_the_primary(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            primary, replica = os.path.join(tmp, 'primary.sqlite3'), os.path.join(tmp, 'replica.sqlite3')
+            with sqlite3.connect(primary) as db:
+                db.execute('CREATE TABLE t (x)')
+                db.execute('INSERT INTO t VALUES (42)')
+            db.close()
+            call_command('sync_replica', source=primary, target=replica, stdout=StringIO())
+            db = sqlite3.connect(replica)
+            self.assertEqual(db.execute('SELECT x FROM t').fetchall(), [(42,)])
+            db.close()
+
+
+class SessionStorageTests(TestCase):
+    def setUp(self):
+        self.seller, self.products = make_catalogue(shop_count=1, products_per_shop=2)
+
+    def assertCartWithoutWrites(self):
+        client = Client()
+        with CaptureQueriesContext(connection) as queries:
+            client.post(reverse('add_to_cart', args=[self.products[0].pk]))
+            client.post(reverse('add_to_cart', args=[self.products[1].pk]))
+            client.post(reverse('remove_from_cart', args=[self.products[0].pk]))
+        # Stock holds are the only rows a cart writes.
+        writes = [
+            q['sql'] for q in queries
+            if not q['sql'].lstrip().upper().startswith(('SELECT', 'SAVEPOINT', 'RELEASE SAVEPOINT'))
+            and 'core_stockreservation' not in q['sql']
+        ]
+        self.assertEqual(writes, [])
+        self.assertEqual(Cart(client.session).quantities, {str(self.products[1].pk): 1})
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cache', SESSION_CACHE_ALIAS='memory_sessions')
+    def test_cache_sessions_never_write_to_database(self):
+        self.assertCartWithoutWrites()
+
+    def test_session_file_cache_culls_once_in_a_while(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            sessions = SessionFileCache(tmp, {'OPTIONS': {'MAX_ENTRIES': 2, 'CULL_INTERVAL': 60}})
+            with mock.patch.object(sessions, '_list_cache_files', wraps=sessions._list_cache_files) as listing:
+                for i in range(5):
+                    sessions.set(f'session{i}', i)
+            self.assertEqual(listing.call_count, 1)
+            self.assertEqual(sessions.get('session4'), 4)
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_cookie_sessions_never_write_to_database(self):
+        self.assertCartWithoutWrites()
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create_user('seller')
+        self.shop = Shop.objects.create(owner=self.seller, name='Boutique')
+        self.other_shop = Shop.objects.create(owner=self.seller, name='Autre')
+        self.tea = Category.objects.create(shop=self.shop, name='Thés')
+        self.lamp = Product.objects.create(
+            shop=self.shop, name='Lampe de bureau', description='Éclairage LED', price=Decimal('30'), stock=3,
+        )
+        self.mug = Product.objects.create(
+            shop=self.shop, category=self.tea, name='Mug', description='Idéal près de votre lampe',
+            price=Decimal('8'), stock=10,
+        )
+        self.sold_out = Product.objects.create(
+            shop=self.other_shop, name='Lampe torche', description='', price=Decimal('12'), stock=0,
+        )
+
+    def names(self, text, **filters):
+        return [p.name for p in search_products(text, **filters)[0]]
+
+    def test_ranks_name_matches_first_and_filters(self):
+        self.assertEqual(self.names('lampe'), ['Lampe de bureau', 'Mug'])
+        self.assertEqual(self.names('lamp', in_stock=False)[-1], 'Mug')
+        self.assertEqual(self.names('lampe', max_price=10), ['Mug'])
+        self.assertEqual(self.names('lampe', in_stock=False, shop=self.other_shop.pk), ['Lampe torche'])
+        self.assertEqual(self.names('eclairage'), ['Lampe de bureau'])
+
+    def test_index_follows_writes(self):
+        self.assertEqual(self.names('thés'), ['Mug'])
+        self.tea.name = 'Tisanes'
+        self.tea.save()
+        self.assertEqual(self.names('tisanes', category=self.tea.pk), ['Mug'])
+        Product.objects.filter(pk=self.lamp.pk).update(name='Lampadaire')
+        self.assertEqual(self.names('lampadaire'), ['Lampadaire'])
+        self.mug.delete()
+        self.assertEqual(self.names('tisanes'), [])
+
+    def test_view_paginates(self):
+        Product.objects.bulk_create([
+            Product(shop=self.shop, name=f'Lampe {i}', description='', price=Decimal('5'), stock=1)
+            for i in range(25)
+        ])
+        first = self.client.get(reverse('search'), {'q': 'lampe'})
+        self.assertEqual(len(first.context['products']), 20)
+        self.assertTrue(first.context['has_next'])
+        second = self.client.get(reverse('search'), {'q': 'lampe', 'page': 2})
+        self.assertEqual(len(second.context['products']), 7)
+        self.assertFalse(second.context['has_next'])
+
+    def test_out_of_range_filters_are_rejected(self):
+        response = self.client.get(reverse('search'), {'q': 'café', 'shop': '9' * 23, 'category': 2 ** 63})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.context['form'].errors), {'shop', 'category'})
@@ -8,6 +8,7 @@ urlpatterns = [
     path('boutiques/', views.shop_list, name='shop_list'),
     path('boutique/<int:pk>/', views.shop_detail, name='shop_detail'),
     path('produit/<int:pk>/', views.product_detail, name='product_detail'),
+    path('recherche/', views.search, name='search'),
 
     # Authentification
     path('inscription/', views.register, name='register'),
@@ -18,13 +19,21 @@ urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
     path('creer-boutique/', views.create_shop, name='create_shop'),
     path('boutique/<int:pk>/ajouter-produit/', views.add_product, name='add_product'),
+    path('boutique/<int:pk>/importer/', views.import_products, name='import_products'),
+    path('boutique/<int:pk>/export/produits/', views.export_products, name='export_products'),
+    path('boutique/<int:pk>/export/commandes/', views.export_orders, name='export_orders'),
+    path('boutique/<int:pk>/rapport/', views.order_report, name='order_report'),
     path('commande/<int:order_id>/statut/', views.update_order_status, name='update_order_status'),
+    path('commandes/statut/', views.bulk_update_order_status, name='bulk_update_order_status'),
 
     # Espace acheteur
     path('mes-commandes/', views.my_orders, name='my_orders'),
+    path('mes-commandes/suite/', views.my_orders_json, name='my_orders_json'),
 
     # Notifications
     path('notifications/', views.notifications_view, name='notifications'),
+    path('notifications/non-lues/', views.unread_notifications, name='unread_notifications'),
+    path('notifications/flux/', views.notification_stream, name='notification_stream'),
     path('notifications/<int:notif_id>/lire/', views.mark_notification_read, name='mark_notification_read'),
 
     # Panier
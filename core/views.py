@@ -1,28 +1,100 @@
 import json
-from datetime import timedelta
-from django.shortcuts import render, get_object_or_404, redirect
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Count
-from django.utils import timezone
+from django.db import transaction
+from django.db.models import Count, Prefetch
+from django.db.models.functions import Left
 from django.core.serializers.json import DjangoJSONEncoder
-from django.http import JsonResponse
-from .models import Shop, Product, Order, OrderItem, Category, Notification
-from .forms import CustomUserCreationForm, ShopForm, ProductForm
-
-
-def create_notification(recipient, notif_type, order, message):
-    Notification.objects.create(recipient=recipient, notif_type=notif_type, order=order, message=message)
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.utils import timezone
+from .models import Shop, Product, Order, OrderItem, Category, Notification, ShopDailyStats
+from .forms import (
+    MAX_ID, CustomUserCreationForm, ShopForm, ProductForm, ProductImportForm, ProductSearchForm, OrderReportForm,
+)
+from .caching import HOME, SHOP_LIST, awith_versions, cache_public_page, product_scope, shop_scope, with_versions
+from .cart import Cart
+from . import counters, live, reservations
+from .checkout import place_orders, CheckoutError
+from .context_processors import aload, anotifications_ctx
+from .stats import STATUSES
+from .notifications import add_unread, aunread_count, queue
+from .orders import bulk_update_status, status_notification
+from .routers import primary_reads
+from .pagination import akeyset_paginate, keyset_paginate, InvalidCursor
+from . import product_io, reports
+from .search import search_products
+
+ORDERS_PER_PAGE = 10
+NOTIFS_PER_PAGE = 20
+INCOMING_ORDERS_PER_PAGE = 20
+SHOPS_PER_PAGE = 24
+PRODUCTS_PER_PAGE = 24
+REPORT_PREVIEW_ROWS = 50
+
+# Label and ordering of each catalogue sort (the last field breaks ties).
+SHOP_SORTS = {
+    'newest': ('Plus récentes', ('-created_at', '-id')),
+    'name':   ('Nom', ('name', 'id')),
+}
+PRODUCT_SORTS = {
+    'newest': ('Nouveautés', ('-created_at', '-id')),
+    'price':  ('Prix croissant', ('price', 'id')),
+    '-price': ('Prix décroissant', ('-price', '-id')),
+    'name':   ('Nom', ('name', 'id')),
+}
+
+
+async def _arender(request, template_name, context):
+    """``render`` for async views.
+
+    Templates do blocking work (``{% picture %}`` checks the storage and may
+    generate derivatives), so they render in the sync thread, not on the
+    event loop.
+    """
+    await aload(request)
+    context = {**await anotifications_ctx(request), **context}
+    return await sync_to_async(render)(request, template_name, context)
+
+
+@cache_public_page(lambda: [HOME])
+async def home(request):
+    products = await awith_versions(
+        [product async for product in Product.objects.filter(stock__gt=0).select_related('category', 'shop')[:8]],
+        product_scope,
+    )
+    totals = await counters.atotals()
+    return await _arender(request, 'core/index.html', {
+        'products': products,
+        'total_products': totals['products'], 'total_sales': totals['delivered_orders'],
+        'total_shops': totals['shops'],
+    })
 
 
-def home(request):
-    shops = Shop.objects.all()[:6]
-    products = Product.objects.filter(stock__gt=0).select_related('category', 'shop')[:8]
-    total_products = Product.objects.count()
-    total_sales = Order.objects.filter(status='delivered').count()
-    return render(request, 'core/index.html', {
-        'shops': shops, 'products': products,
-        'total_products': total_products, 'total_sales': total_sales,
+def search(request):
+    data = request.GET.copy()
+    if 'q' in data and 'in_stock' not in data and 'filtered' not in data:
+        data['in_stock'] = 'on'
+    form = ProductSearchForm(data)
+    products, has_next, page = [], False, 1
+    if form.is_valid() and form.cleaned_data['q']:
+        filters = form.cleaned_data
+        page = filters['page'] or 1
+        products, has_next = search_products(
+            filters['q'], page=page,
+            shop=filters['shop'], category=filters['category'],
+            min_price=filters['min_price'], max_price=filters['max_price'],
+            in_stock=filters['in_stock'],
+        )
+        with_versions(products, product_scope)
+    params = data.copy()
+    params.pop('page', None)
+    return render(request, 'core/search.html', {
+        'form': form, 'products': products, 'page': page, 'has_next': has_next,
+        'query_string': params.urlencode(),
     })
 
 
@@ -41,110 +113,171 @@ def register(request):
 @login_required
 def dashboard(request):
     user_shops = request.user.shops.all()
-    total_products = Product.objects.filter(shop__in=user_shops).count()
-    total_orders   = Order.objects.filter(shop__in=user_shops).count()
-    total_revenue  = (
-        Order.objects.filter(shop__in=user_shops, status='delivered')
-        .aggregate(Sum('total'))['total__sum'] or 0
-    )
-    today = timezone.now()
-    last_12_months, sales_data = [], []
-    for i in range(11, -1, -1):
-        date = today - timedelta(days=30 * i)
-        last_12_months.append(date.strftime('%b'))
-        sales_data.append(
-            Order.objects.filter(shop__in=user_shops, created_at__year=date.year, created_at__month=date.month).count()
-        )
+    shops = user_shops.annotate(product_count=Count('products'))
+    total_products = sum(shop.product_count for shop in shops)
+    rollup = ShopDailyStats.objects.filter(shop__in=user_shops)
+    totals = rollup.summary()
+    last_12_months, sales_data = rollup.monthly_series()
     recent_products = (
         Product.objects.filter(shop__in=user_shops)
+        .select_related('category')
         .annotate(sales_count=Count('orderitem'))
         .order_by('-created_at')[:5]
     )
-    incoming_orders = (
-        Order.objects.filter(shop__in=user_shops)
-        .select_related('customer', 'shop')
-        .prefetch_related('items__product')
-        .order_by('-created_at')[:20]
-    )
-    qs = Order.objects.filter(shop__in=user_shops)
-    pending_orders    = qs.filter(status='pending').count()
-    delivered_orders  = qs.filter(status='delivered').count()
-    processing_orders = qs.filter(status='processing').count()
-    cancelled_orders  = qs.filter(status='cancelled').count()
-    unread_notifs = request.user.notifications.filter(is_read=False).count()
+    try:
+        incoming_orders = keyset_paginate(
+            Order.objects.filter(seller=request.user)
+            .select_related('customer', 'shop')
+            .prefetch_related(Prefetch('items', queryset=OrderItem.objects.select_related('product').only(
+                'order_id', 'product__name',
+            ))),
+            cursor=request.GET.get('orders_cursor'), per_page=INCOMING_ORDERS_PER_PAGE,
+        )
+    except InvalidCursor:
+        return redirect('dashboard')
 
     return render(request, 'core/dashboard.html', {
-        'shops': user_shops,
+        'shops': shops,
         'total_products': total_products,
-        'total_orders': total_orders,
-        'total_revenue': total_revenue,
+        **totals,
         'chart_labels': json.dumps(last_12_months, cls=DjangoJSONEncoder),
         'chart_data': json.dumps(sales_data, cls=DjangoJSONEncoder),
         'recent_products': recent_products,
         'incoming_orders': incoming_orders,
-        'pending_orders': pending_orders,
-        'delivered_orders': delivered_orders,
-        'processing_orders': processing_orders,
-        'cancelled_orders': cancelled_orders,
-        'unread_notifs': unread_notifs,
     })
 
 
 @login_required
 def update_order_status(request, order_id):
-    order = get_object_or_404(Order, pk=order_id)
-    if order.shop.owner != request.user:
-        messages.error(request, "Vous n'êtes pas autorisé à modifier cette commande.")
+    if request.method != 'POST':
         return redirect('dashboard')
-    if request.method == 'POST':
-        new_status = request.POST.get('status')
-        allowed = ['pending', 'processing', 'shipped', 'delivered', 'cancelled']
-        if new_status not in allowed:
+    new_status = request.POST.get('status')
+    with transaction.atomic():
+        # Read and locked inside the transaction, as in bulk_update_status, so
+        # two concurrent changes never both count the old status.
+        order = get_object_or_404(Order.objects.select_related('shop').select_for_update(), pk=order_id)
+        if order.shop.owner_id != request.user.pk:
+            messages.error(request, "Vous n'êtes pas autorisé à modifier cette commande.")
+            return redirect('dashboard')
+        if new_status not in STATUSES:
             messages.error(request, "Statut invalide.")
             return redirect('dashboard')
         order.status = new_status
         order.save(update_fields=['status'])
-        status_msgs = {
-            'processing': f'Votre commande #{order.id} de « {order.shop.name} » est en cours de préparation.',
-            'shipped':    f'Votre commande #{order.id} de « {order.shop.name} » a été expédiée ! 🚚',
-            'delivered':  f'Votre commande #{order.id} de « {order.shop.name} » a été livrée. Merci ! 🎉',
-            'cancelled':  f'Votre commande #{order.id} de « {order.shop.name} » a été annulée.',
-        }
-        if new_status in status_msgs:
-            create_notification(
-                recipient=order.customer,
-                notif_type=f'order_{new_status}',
-                order=order,
-                message=status_msgs[new_status],
-            )
-        label = dict(Order.STATUS_CHOICES).get(new_status, new_status)
-        messages.success(request, f'Commande #{order.id} → {label}')
+    notif = status_notification(order, order.shop.name, new_status)
+    if notif is not None:
+        queue([notif])
+    label = dict(Order.STATUS_CHOICES).get(new_status, new_status)
+    messages.success(request, f'Commande #{order.id} → {label}')
     return redirect('dashboard')
 
 
 @login_required
-def my_orders(request):
+def bulk_update_order_status(request):
+    if request.method != 'POST':
+        return redirect('dashboard')
+    new_status = request.POST.get('status')
+    try:
+        order_ids = [int(pk) for pk in request.POST.getlist('order_ids')]
+    except ValueError:
+        order_ids = None
+    if order_ids and not all(1 <= pk <= MAX_ID for pk in order_ids):
+        order_ids = None
+    if new_status not in STATUSES or not order_ids:
+        if 'application/json' in request.headers.get('Accept', ''):
+            return JsonResponse({'status': 'error', 'message': 'Requête invalide.'}, status=400)
+        messages.error(request, "Sélectionnez au moins une commande et un statut valide.")
+        return redirect('dashboard')
+
+    results = bulk_update_status(request.user, order_ids, new_status)
+    if 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse({'status': 'ok', 'results': {str(pk): res for pk, res in results.items()}})
+    updated = [pk for pk, res in results.items() if res == 'ok']
+    rejected = [pk for pk, res in results.items() if res != 'ok']
+    label = dict(Order.STATUS_CHOICES)[new_status]
+    if updated:
+        messages.success(request, f'{len(updated)} commande(s) → {label}')
+    if rejected:
+        messages.warning(request, 'Non modifiée(s) : ' + ', '.join(f'#{pk} ({results[pk]})' for pk in rejected))
+    return redirect('dashboard')
+
+
+def _my_orders_page(request):
+    items = OrderItem.objects.select_related('product').only(
+        'order_id', 'quantity', 'price', 'product__name', 'product__image', 'product__image_status',
+    )
     orders = (
         request.user.orders
         .select_related('shop')
-        .prefetch_related('items__product')
-        .order_by('-created_at')
+        .only('customer_id', 'created_at', 'status', 'total', 'shop__name')
+        .prefetch_related(Prefetch('items', queryset=items))
     )
+    return keyset_paginate(orders, cursor=request.GET.get('cursor'), per_page=ORDERS_PER_PAGE)
+
+
+@login_required
+def my_orders(request):
+    try:
+        orders = _my_orders_page(request)
+    except InvalidCursor:
+        return redirect('my_orders')
     return render(request, 'core/my_orders.html', {'orders': orders})
 
 
+@login_required
+def my_orders_json(request):
+    try:
+        orders = _my_orders_page(request)
+    except InvalidCursor:
+        return JsonResponse({'status': 'error', 'message': 'Curseur invalide.'}, status=400)
+    html = ''.join(
+        render_to_string('core/partials/order_card.html', {'order': order}, request=request)
+        for order in orders
+    )
+    return JsonResponse({'html': html, 'next_cursor': orders.next_cursor})
+
+
 @login_required
 def notifications_view(request):
-    notifs = request.user.notifications.select_related('order__shop').all()
-    notifs.filter(is_read=False).update(is_read=True)
+    try:
+        notifs = keyset_paginate(
+            request.user.notifications.all(), cursor=request.GET.get('cursor'), per_page=NOTIFS_PER_PAGE,
+        )
+    except InvalidCursor:
+        return redirect('notifications')
+    unread = [notif.pk for notif in notifs if not notif.is_read]
+    if unread:
+        marked = Notification.objects.filter(pk__in=unread, is_read=False).update(is_read=True)
+        add_unread([request.user.pk], -marked)
     return render(request, 'core/notifications.html', {'notifs': notifs})
 
 
+@login_required
+async def unread_notifications(request):
+    """Unread count polled by the navbar bell."""
+    return JsonResponse({'unread': await aunread_count(await request.auser())})
+
+
+@login_required
+async def notification_stream(request):
+    """Server-Sent Events: new notifications and the unread count, as they happen."""
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI the stream would tie up a worker: a 204 stops EventSource
+        # and the bell falls back to polling unread_notifications.
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(live.stream(await request.auser()), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @login_required
 def mark_notification_read(request, notif_id):
     notif = get_object_or_404(Notification, pk=notif_id, recipient=request.user)
-    notif.is_read = True
-    notif.save(update_fields=['is_read'])
+    if not notif.is_read:
+        notif.is_read = True
+        notif.save(update_fields=['is_read'])
+        add_unread([request.user.pk], -1)
     return JsonResponse({'status': 'ok'})
 
 
@@ -163,16 +296,60 @@ def create_shop(request):
     return render(request, 'core/create_shop.html', {'form': form})
 
 
-def shop_list(request):
-    shops = Shop.objects.all().annotate(product_count=Count('products'))
-    return render(request, 'core/shop_list.html', {'shops': shops})
+def _sort(request, sorts):
+    """Return the requested sort key and its ordering, the first one by default."""
+    sort = request.GET.get('sort')
+    if sort not in sorts:
+        sort = next(iter(sorts))
+    return sort, sorts[sort][1]
 
 
-def shop_detail(request, pk):
-    shop = get_object_or_404(Shop, pk=pk)
-    products = shop.products.filter(stock__gt=0).select_related('category')
-    is_owner = request.user.is_authenticated and shop.owner == request.user
-    return render(request, 'core/shop_detail.html', {'shop': shop, 'products': products, 'is_owner': is_owner})
+@cache_public_page(lambda: [SHOP_LIST])
+async def shop_list(request):
+    sort, ordering = _sort(request, SHOP_SORTS)
+    shops = (
+        Shop.objects.select_related('owner')
+        .only('name', 'logo', 'logo_status', 'created_at', 'owner__first_name', 'owner__last_name')
+        .annotate(excerpt=Left('description', 120))
+    )
+    try:
+        shops = await akeyset_paginate(shops, ordering, request.GET.get('cursor'), per_page=SHOPS_PER_PAGE)
+    except InvalidCursor:
+        return redirect('shop_list')
+    counts = {
+        shop_id: n async for shop_id, n in
+        Product.objects.filter(shop__in=[shop.pk for shop in shops]).order_by()
+        .values('shop').annotate(n=Count('id')).values_list('shop', 'n')
+    }
+    for shop in await awith_versions(shops, shop_scope):
+        shop.product_count = counts.get(shop.pk, 0)
+    return await _arender(request, 'core/shop_list.html', {'shops': shops, 'sort': sort, 'sorts': SHOP_SORTS})
+
+
+@cache_public_page(lambda pk: [shop_scope(pk)])
+async def shop_detail(request, pk):
+    shop = await aget_object_or_404(Shop.objects.select_related('owner'), pk=pk)
+    sort, ordering = _sort(request, PRODUCT_SORTS)
+    categories = [category async for category in shop.categories.only('shop', 'name')]
+    category = next((c for c in categories if str(c.pk) == request.GET.get('category')), None)
+    products = (
+        shop.products.filter(stock__gt=0)
+        .select_related('category')
+        .only('shop_id', 'name', 'price', 'stock', 'image', 'image_status', 'created_at', 'category__name')
+        .annotate(excerpt=Left('description', 160))
+    )
+    if category is not None:
+        products = products.filter(category=category)
+    try:
+        products = await akeyset_paginate(products, ordering, request.GET.get('cursor'), per_page=PRODUCTS_PER_PAGE)
+    except InvalidCursor:
+        return redirect('shop_detail', pk=shop.pk)
+    await awith_versions(products, product_scope)
+    is_owner = request.user.is_authenticated and shop.owner_id == request.user.pk
+    return await _arender(request, 'core/shop_detail.html', {
+        'shop': shop, 'products': products, 'is_owner': is_owner,
+        'categories': categories, 'category': category, 'sort': sort, 'sorts': PRODUCT_SORTS,
+    })
 
 
 @login_required
@@ -191,112 +368,145 @@ def add_product(request, pk):
     return render(request, 'core/add_product.html', {'form': form, 'shop': shop})
 
 
-def product_detail(request, pk):
-    product = get_object_or_404(Product, pk=pk)
-    is_owner = request.user.is_authenticated and product.shop.owner == request.user
-    return render(request, 'core/product_detail.html', {'product': product, 'is_owner': is_owner})
+@login_required
+def import_products(request, pk):
+    shop = get_object_or_404(Shop, pk=pk, owner=request.user)
+    report = None
+    if request.method == 'POST':
+        form = ProductImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            report = product_io.import_products(shop, upload, product_io.detect_format(upload.name))
+            message = f'{report.created} produit(s) créé(s), {report.updated} mis à jour'
+            if report.failed:
+                messages.warning(request, f'{message}, {report.failed} ligne(s) ignorée(s).')
+            else:
+                messages.success(request, f'{message}.')
+                return redirect('shop_detail', pk=shop.pk)
+    else:
+        form = ProductImportForm()
+    return render(request, 'core/import_products.html', {'form': form, 'shop': shop, 'report': report})
+
+
+def _export_response(lines, filename, fmt):
+    content_type = 'application/x-ndjson' if fmt == 'jsonl' else 'text/csv; charset=utf-8'
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+@login_required
+def export_products(request, pk):
+    shop = get_object_or_404(Shop, pk=pk, owner=request.user)
+    fmt = request.GET.get('format') if request.GET.get('format') in product_io.FORMATS else 'csv'
+    return _export_response(product_io.export_products(shop, fmt), f'produits-boutique-{shop.pk}', fmt)
+
+
+@login_required
+def export_orders(request, pk):
+    shop = get_object_or_404(Shop, pk=pk, owner=request.user)
+    fmt = request.GET.get('format') if request.GET.get('format') in product_io.FORMATS else 'csv'
+    return _export_response(reports.export_order_lines(shop, fmt), f'commandes-boutique-{shop.pk}', fmt)
+
+
+@login_required
+def order_report(request, pk):
+    shop = get_object_or_404(Shop, pk=pk, owner=request.user)
+    today = timezone.localdate()
+    data = request.GET.copy()
+    if 'start' not in data and 'end' not in data:
+        # Current month by default; empty fields cover the whole history.
+        data.update({'start': today.replace(day=1).isoformat(), 'end': today.isoformat()})
+    form = OrderReportForm(data)
+    if not form.is_valid():
+        return render(request, 'core/order_report.html', {'shop': shop, 'form': form})
+    start, end = form.cleaned_data['start'], form.cleaned_data['end']
+    period = f'{start or "debut"}_{end or today}'
+    download = request.GET.get('download')
+    if download == 'lines':
+        return _export_response(reports.export_order_lines(shop, 'csv', start, end),
+                                f'commandes-{shop.pk}-{period}', 'csv')
+    if download == 'products':
+        return _export_response(reports.export_product_totals(shop, 'csv', start, end),
+                                f'ventes-par-produit-{shop.pk}-{period}', 'csv')
+    return render(request, 'core/order_report.html', {
+        'shop': shop, 'form': form,
+        'totals': reports.product_totals(shop, start, end)[:REPORT_PREVIEW_ROWS],
+    })
+
+
+@cache_public_page(lambda pk: [product_scope(pk)])
+async def product_detail(request, pk):
+    product = await aget_object_or_404(Product.objects.select_related('shop', 'category'), pk=pk)
+    is_owner = request.user.is_authenticated and product.shop.owner_id == request.user.pk
+    return await _arender(request, 'core/product_detail.html', {'product': product, 'is_owner': is_owner})
 
 
 def cart_detail(request):
-    cart = request.session.get('cart', {})
-    items, total = [], 0
-    for product_id, quantity in list(cart.items()):
-        try:
-            product = Product.objects.get(pk=int(product_id))
-            subtotal = product.price * quantity
-            total += subtotal
-            items.append({'product': product, 'quantity': quantity, 'subtotal': subtotal})
-        except Product.DoesNotExist:
-            del cart[product_id]
-            request.session['cart'] = cart
+    cart = Cart(request.session)
+    holder = request.session.get(Cart.HOLDER_KEY)
+    if cart and holder:
+        # The cart is being looked at: its holds are extended.
+        reservations.extend(holder)
+    items, total = cart.lines()
     return render(request, 'core/cart.html', {'items': items, 'total': total})
 
 
+@primary_reads
 def add_to_cart(request, product_id):
-    product = get_object_or_404(Product, pk=product_id)
-    if request.user.is_authenticated and product.shop.owner == request.user:
+    # A link followed by a crawler must not hold stock.
+    if request.method != 'POST':
+        return redirect('product_detail', pk=product_id)
+    product = get_object_or_404(Product.objects.select_related('shop'), pk=product_id)
+    if request.user.is_authenticated and product.shop.owner_id == request.user.pk:
         messages.error(request, "Vous ne pouvez pas ajouter vos propres produits au panier.")
         return redirect('product_detail', pk=product_id)
     if product.stock <= 0:
         messages.error(request, f'« {product.name} » est en rupture de stock.')
         return redirect('product_detail', pk=product_id)
-    cart = request.session.get('cart', {})
-    current_qty = cart.get(str(product_id), 0)
-    if current_qty >= product.stock:
+    cart = Cart(request.session)
+    if cart.quantity(product_id) >= product.stock:
         messages.warning(request, f'Stock maximum atteint pour « {product.name} ».')
         return redirect('cart_detail')
-    cart[str(product_id)] = current_qty + 1
-    request.session['cart'] = cart
+    try:
+        reservations.hold(cart.holder, product, cart.quantity(product_id) + 1)
+    except reservations.ReservationError as exc:
+        messages.warning(request, str(exc))
+        if cart.quantity(product_id):
+            return redirect('cart_detail')
+        return redirect('product_detail', pk=product_id)
+    cart.add(product)
     messages.success(request, f'« {product.name} » ajouté au panier.')
     return redirect('cart_detail')
 
 
+@primary_reads
 def remove_from_cart(request, product_id):
-    cart = request.session.get('cart', {})
-    if str(product_id) in cart:
-        del cart[str(product_id)]
-        request.session['cart'] = cart
+    if request.method != 'POST':
+        return redirect('cart_detail')
+    cart = Cart(request.session)
+    if cart.remove(product_id):
+        reservations.release(cart.holder, [product_id])
         messages.success(request, 'Produit retiré du panier.')
     return redirect('cart_detail')
 
 
+@primary_reads
 @login_required
 def checkout(request):
-    cart = request.session.get('cart', {})
+    if request.method != 'POST':
+        return redirect('cart_detail')
+    cart = Cart(request.session)
     if not cart:
         messages.error(request, 'Votre panier est vide.')
         return redirect('shop_list')
 
-    items_to_process = []
-    for product_id, quantity in cart.items():
-        try:
-            product = Product.objects.get(pk=int(product_id))
-        except Product.DoesNotExist:
-            messages.error(request, 'Un produit de votre panier est introuvable.')
-            return redirect('cart_detail')
-        if product.shop.owner == request.user:
-            messages.error(
-                request,
-                f'« {product.name} » appartient à votre boutique « {product.shop.name} ». '
-                'Impossible de commander vos propres produits.'
-            )
-            return redirect('cart_detail')
-        if product.stock < quantity:
-            messages.error(request, f'Stock insuffisant pour « {product.name} » (disponible : {product.stock}).')
-            return redirect('cart_detail')
-        items_to_process.append((product, quantity))
-
-    shops_map: dict = {}
-    for product, quantity in items_to_process:
-        sid = product.shop_id
-        if sid not in shops_map:
-            shops_map[sid] = {'shop': product.shop, 'items': []}
-        shops_map[sid]['items'].append((product, quantity))
-
-    for sid, data in shops_map.items():
-        order = Order.objects.create(customer=request.user, shop=data['shop'], status='pending', total=0)
-        order_total = 0
-        product_names = []
-        for product, quantity in data['items']:
-            OrderItem.objects.create(order=order, product=product, quantity=quantity, price=product.price)
-            product.stock -= quantity
-            product.save(update_fields=['stock'])
-            order_total += product.price * quantity
-            product_names.append(product.name)
-        order.total = order_total
-        order.save(update_fields=['total'])
-
-        buyer_name = f"{request.user.first_name} {request.user.last_name}".strip() or request.user.username
-        create_notification(
-            recipient=data['shop'].owner,
-            notif_type='new_order',
-            order=order,
-            message=(
-                f"🛒 Nouvelle commande #{order.id} sur « {data['shop'].name} » "
-                f"de {buyer_name} — {order_total:.2f} € ({', '.join(product_names)})."
-            ),
-        )
+    try:
+        place_orders(request.user, cart.quantities, holder=cart.holder)
+    except CheckoutError as exc:
+        messages.error(request, str(exc))
+        return redirect('cart_detail')
 
-    request.session['cart'] = {}
+    cart.clear()
     messages.success(request, '🎉 Commande passée avec succès ! Le vendeur a été notifié.')
     return redirect('my_orders')